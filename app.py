@@ -7,6 +7,10 @@ from flask import Flask, request, jsonify
 import subprocess
 import shutil
 import threading
+import json
+import queue
+import collections
+import math
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
@@ -57,13 +61,14 @@ PDFTOPRINTER_PATH = os.path.join(BASE_DIR, 'PDFtoPrinter.exe')
 LOG_FILE = os.path.join(BASE_DIR, 'print.log')
 CACHE_DIR = os.path.join(BASE_DIR, 'pdf_cache')
 MAX_CACHE = 5
+CONFIG_FILE = os.path.join(BASE_DIR, 'print_config.json')
 
 app = Flask(__name__)
 PRINT_ALLOWED = True
 PRINT_PAUSED = False
 PORT = 12345  # Flask HTTP 端口 (Flask HTTP Port)
+WS_MAX_QUEUE = 4  # 每个 WebSocket 连接在服务端缓存的未处理消息数上限 (Max unread messages buffered per WebSocket connection)
 WS_PORT = 12346  # WebSocket 独立端口，需与前端 ws://localhost:12346 保持一致 (WebSocket independent port, needs to match frontend ws://localhost:12346)
-current_paper_size = '' # This variable is not used to control paper size, it's fixed below (此变量不用于控制纸张尺寸，它在下面是固定的)
 
 # --- 开机自启动功能相关代码 (Auto-start functionality related code) ---
 AUTOSTART_REG_KEY = r"Software\Microsoft\Windows\CurrentVersion\Run"
@@ -115,173 +120,894 @@ def disable_autostart():
 
 # --- 现有代码保持不变 (Existing code remains unchanged) ---
 
+# --- 界面事件队列：服务核心只投递事件，界面合并后批量刷新 (GUI event queue: the service core posts events, the GUI applies them in coalesced batches) ---
+GUI_REFRESH_MS = 100     # 事件合并窗口 (Coalescing window for GUI repaints)
+LOG_KEEP_LINES = 100     # 日志文件保留行数 (Lines kept in the log file)
+LOG_VIEW_MAX_LINES = 200 # 日志窗口最多显示行数 (Max lines in the log view)
+JOB_VIEW_MAX_ROWS = 200  # 任务列表最多保留行数 (Max rows in the job list)
+GUI_EVENTS = queue.SimpleQueue()
+gui_event_handler = None  # 由 start_gui 设置 (Set by start_gui)
+_gui_lock = threading.Lock()
+_gui_drain_scheduled = False
+_busy_jobs = 0
+_log_lock = threading.Lock()
+_log_appended = 0
+
+def emit_gui_event(kind, data=None):
+    """投递界面事件；无界面时直接忽略 (Post a GUI event; ignored when there is no GUI)"""
+    global _gui_drain_scheduled
+    if gui_event_handler is None or root is None:
+        return
+    GUI_EVENTS.put((kind, data))
+    with _gui_lock:
+        if _gui_drain_scheduled:
+            return
+        _gui_drain_scheduled = True
+    try:
+        root.after(GUI_REFRESH_MS, _drain_gui_events)
+    except Exception:
+        _gui_drain_scheduled = False
+
+def _drain_gui_events():
+    global _gui_drain_scheduled
+    with _gui_lock:
+        _gui_drain_scheduled = False
+    events = []
+    while True:
+        try:
+            events.append(GUI_EVENTS.get_nowait())
+        except queue.Empty:
+            break
+    if events and gui_event_handler:
+        gui_event_handler(events)
+
 def log(msg):
+    global _log_appended
+    line = f"{datetime.now()} {msg}\n"
     try:
-        # 先读取现有日志，保留最后99条 (Read existing logs first, keep the last 99 lines)
-        lines = []
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r', encoding='utf-8') as f:
-                lines = f.readlines()[-99:]
-        # 新日志追加 (Append new log)
-        lines.append(f"{datetime.now()} {msg}\n")
-        with open(LOG_FILE, 'w', encoding='utf-8') as f:
-            f.writelines(lines)
+        with _log_lock:
+            # 追加写入，累计超过一倍保留行数时才截断一次 (Append; trim once the file has grown past twice the kept lines)
+            with open(LOG_FILE, 'a', encoding='utf-8') as f:
+                f.write(line)
+            _log_appended += 1
+            if _log_appended >= LOG_KEEP_LINES:
+                with open(LOG_FILE, 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+                if len(lines) > 2 * LOG_KEEP_LINES:
+                    with open(LOG_FILE, 'w', encoding='utf-8') as f:
+                        f.writelines(lines[-LOG_KEEP_LINES:])
+                _log_appended = 0
     except Exception as e:
         print(f"[日志写入异常] {e}。缓存/日志目录无写入权限，请检查文件夹权限或以管理员身份运行。", file=sys.stderr)
     # 实时刷新日志到GUI (Refresh log to GUI in real-time)
-    global root, logbox
-    if logbox and root:
-        root.after(0, lambda: _update_logbox(msg))
-
-def _update_logbox(msg):
-    global logbox
-    if logbox:
-        logbox.insert(tk.END, f"{datetime.now()} {msg}\n")
-        logbox.see(tk.END)
+    emit_gui_event('log', line)
+
+def clear_log_file():
+    """清空日志文件，与 log() 的追加和截断互斥 (Truncate the log file, serialized with the append-and-trim in log())"""
+    global _log_appended
+    with _log_lock:
+        with open(LOG_FILE, 'w', encoding='utf-8') as f:
+            f.write("")
+        _log_appended = 0
+
+def get_printers():
+    """获取本机及网络连接的打印机名称列表 (Get names of local and connected network printers)"""
+    try:
+        flags = win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
+        return [p[2] for p in win32print.EnumPrinters(flags, None, 1)]
+    except Exception as e:
+        log(f'获取打印机列表失败：{e}。请检查打印后台处理程序(Print Spooler)服务是否运行。')
+        return []
+
+def clean_cache():
+    """只保留最近 MAX_CACHE 个缓存PDF (Keep only the latest MAX_CACHE cached PDFs)"""
+    try:
+        files = [os.path.join(CACHE_DIR, f) for f in os.listdir(CACHE_DIR) if f.lower().endswith('.pdf')]
+        files.sort(key=os.path.getmtime, reverse=True)
+        now = datetime.now().timestamp()
+        for path in files[MAX_CACHE:]:
+            # 并发打印时，不删除可能仍在打印中的文件（未超过打印超时时间） (Under concurrent printing, skip files that may still be printing (younger than the print timeout))
+            if now - os.path.getmtime(path) < 60:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    except Exception as e:
+        log(f'清理缓存失败：{e}')
+
+def download_pdf(url):
+    """下载PDF到缓存目录，返回本地路径 (Download a PDF into the cache directory and return its local path)"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp_pdf = os.path.join(CACHE_DIR, f"{uuid.uuid4()}.pdf")
+    try:
+        resp = requests.get(url, timeout=30)
+    except requests.RequestException as e:
+        log(f'PDF下载失败：{url}，错误：{e}。请检查网络连接和PDF地址。')
+        raise Exception(f'PDF下载失败：{e}。建议：检查网络连接和PDF地址。')
+    if resp.status_code != 200:
+        log(f'PDF下载失败：{url}，HTTP状态码：{resp.status_code}。')
+        raise Exception(f'PDF下载失败，HTTP状态码：{resp.status_code}。建议：检查PDF地址是否有效。')
+    with open(temp_pdf, 'wb') as f:
+        f.write(resp.content)
+    clean_cache()
+    return temp_pdf
+
+# --- 打印配置（多纸张/多打印机配置档，支持热加载） (Print config: named profiles, hot-reloadable) ---
+# 各后端的参数模板：args 在加载配置时按配置档字段格式化一次，copies/pages 按任务追加 (Per-backend templates: args are formatted once per profile at load time, copies/pages are appended per job)
+BACKENDS = {
+    'pdftoprinter': {
+        'args': ['/s"{paperSize}"'],
+        'copies': 'copies={}',
+        'pages': 'pages={}',
+        'collate': None,  # 无原生逐份参数，不逐份时展开为页序列 (No native collate switch; uncollated jobs are expanded into a page sequence)
+        # 没有方向和 DPI 参数，按 PDF 自身方向和驱动默认 DPI 打印 (No orientation or DPI switches; prints in the PDF's own orientation at the driver's DPI)
+        'fixed': {'orientation': 'portrait', 'dpi': None},
+    },
+}
+ORIENTATIONS = ('portrait', 'landscape')
+MAX_COPIES = 99
+MAX_PAGES = 1000  # 单次提交的页数上限，含不逐份展开后的页序列 (Max pages per submission, including the expanded uncollated sequence)
+PROFILE_DEFAULTS = {
+    'paperSize': '100x150',
+    'copies': 1,
+    'orientation': 'portrait',
+    'backend': 'pdftoprinter',
+    'dpi': None,
+    'printer': None,     # 该配置档的默认打印机，空则用系统默认打印机 (Default printer for this profile, system default if empty)
+    'printerMap': {},    # 前端打印机名/别名 -> 实际打印机名 (Frontend printer name/alias -> actual printer name)
+    'args': None,        # 自定义参数模板，覆盖后端默认模板 (Custom argument template, overrides the backend default)
+}
+DEFAULT_LIMITS = {
+    'maxInflight': 8,      # 全局同时进行的打印任务数 (Global in-flight print jobs)
+    'maxPerPrinter': 10,   # 单台打印机未完成的任务数，含已在系统打印队列中的 (Unfinished jobs per printer, including those already in the Windows spooler)
+    'ratePerSecond': 20,   # 每个来源每秒补充的令牌数，0 表示不限 (Token refill per origin per second, 0 = unlimited)
+    'burst': 40,           # 每个来源的令牌桶容量 (Token bucket size per origin)
+    'wsWindow': 1,         # 每个 WebSocket 连接同时处理的任务数，满了暂停读取 (Jobs per WebSocket connection; reading pauses when full)
+}
+DEFAULT_CONFIG = {
+    'defaultProfile': 'label',
+    'profiles': {
+        'label': {'paperSize': '100x150'},
+        'a4': {'paperSize': 'A4'},
+    },
+}
+
+def compile_profile(name, raw):
+    """校验配置档并预编译参数列表 (Validate a profile and precompile its argument list)"""
+    profile = dict(PROFILE_DEFAULTS)
+    profile.update(raw or {})
+    profile['name'] = name
+    if profile['backend'] not in BACKENDS:
+        raise ValueError(f'配置档 {name} 的 backend 不支持：{profile["backend"]}')
+    if not isinstance(profile['copies'], int) or not 1 <= profile['copies'] <= MAX_COPIES:
+        raise ValueError(f'配置档 {name} 的 copies 必须是 1~{MAX_COPIES} 的整数')
+    if not isinstance(profile['printerMap'], dict):
+        raise ValueError(f'配置档 {name} 的 printerMap 必须是对象')
+    if profile['orientation'] not in ORIENTATIONS:
+        raise ValueError(f'配置档 {name} 的 orientation 只能是 portrait 或 landscape')
+    dpi = profile['dpi']
+    if dpi is not None and (not isinstance(dpi, int) or isinstance(dpi, bool) or dpi <= 0):
+        raise ValueError(f'配置档 {name} 的 dpi 必须是正整数或 null')
+    template = profile['args'] if profile['args'] is not None else BACKENDS[profile['backend']]['args']
+    # 份数和页码按任务追加，模板里再写一遍会传两个冲突的参数 (Copies and pages are appended per job; repeating them in the template passes conflicting arguments)
+    per_job = tuple(BACKENDS[profile['backend']][k].split('{')[0] for k in ('copies', 'pages'))
+    if any('{copies' in str(t) or str(t).startswith(per_job) for t in template):
+        raise ValueError(f'配置档 {name} 的参数模板不能包含份数或页码参数，它们按任务自动追加。建议：用 copies 字段设置默认份数')
+    # 后端无法表达的设置直接报错，而不是静默忽略 (Settings the backend cannot express are rejected rather than silently ignored)
+    for key, value in BACKENDS[profile['backend']]['fixed'].items():
+        if profile[key] != value and not any('{' + key in str(t) for t in template):
+            raise ValueError(f'配置档 {name}：{profile["backend"]} 后端不支持设置 {key}。建议：去掉该字段，或在 args 参数模板中引用 {{{key}}}')
+    try:
+        profile['compiledArgs'] = tuple(str(t).format(**profile) for t in template)
+    except (KeyError, IndexError) as e:
+        raise ValueError(f'配置档 {name} 的参数模板引用了未知字段：{e}')
+    return profile
+
+def compile_config(raw):
+    """编译整个配置文件，返回新的配置对象 (Compile a whole config file into a new config object)"""
+    profiles = {name: compile_profile(name, p) for name, p in (raw.get('profiles') or {}).items()}
+    if not profiles:
+        raise ValueError('配置文件中没有任何打印配置档 (profiles)')
+    default = raw.get('defaultProfile') or next(iter(profiles))
+    if default not in profiles:
+        raise ValueError(f'defaultProfile 不存在：{default}')
+    fleet = raw.get('fleet') or {}
+    if not isinstance(fleet, dict) or not all(isinstance(fleet.get(k) or '', str) for k in ('dispatcher', 'node', 'token')):
+        raise ValueError('fleet 必须是 {"dispatcher": "ws://...", "node": "工位名", "token": "共享令牌"}')
+    if fleet.get('dispatcher') and not fleet.get('token'):
+        raise ValueError('fleet.token 未设置：接入调度服务必须配置与调度服务一致的共享令牌')
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(raw.get('limits') or {})
+    for key, value in limits.items():
+        if key not in DEFAULT_LIMITS or not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+            raise ValueError(f'limits.{key} 必须是非负数')
+    if limits['maxInflight'] < 1 or limits['maxPerPrinter'] < 1 or limits['wsWindow'] < 1 or limits['burst'] < 1:
+        raise ValueError('limits 中 maxInflight、maxPerPrinter、wsWindow、burst 至少为 1')
+    limits['wsWindow'] = int(limits['wsWindow'])
+    return {'default': default, 'profiles': profiles, 'fleet': fleet, 'limits': limits}
+
+# 整体替换引用实现热加载，进行中的任务继续使用它取到的旧配置 (Reload swaps the whole reference; in-flight jobs keep the config they already took)
+PRINT_CONFIG = compile_config(DEFAULT_CONFIG)
+_config_mtime = None
+
+def load_print_config():
+    """从 CONFIG_FILE 加载配置，文件不存在时写入默认配置；出错时保留旧配置 (Load CONFIG_FILE, writing the default if missing; keep the old config on error)"""
+    global PRINT_CONFIG, _config_mtime
+    if not os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+                json.dump(DEFAULT_CONFIG, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            log(f'写入默认打印配置失败：{e}')
+            return False
+    try:
+        mtime = os.path.getmtime(CONFIG_FILE)
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            new_config = compile_config(json.load(f))
+    except Exception as e:
+        log(f'打印配置加载失败，继续使用当前配置：{e}')
+        _config_mtime = os.path.getmtime(CONFIG_FILE) if os.path.exists(CONFIG_FILE) else None
+        return False
+    PRINT_CONFIG = new_config
+    _config_mtime = mtime
+    log(f'打印配置已加载：{", ".join(new_config["profiles"])}（默认 {new_config["default"]}）')
+    return True
+
+def config_watcher(interval=2, stop=None):
+    """配置文件变化时自动重新加载，无需重启；stop 为可选的 threading.Event (Reload the config file when it changes, no restart needed; stop is an optional threading.Event)"""
+    stop = stop or threading.Event()
+    while not stop.wait(interval):
+        try:
+            mtime = os.path.getmtime(CONFIG_FILE)
+        except OSError:
+            continue
+        if mtime != _config_mtime:
+            load_print_config()
+
+def get_profile(name=None):
+    """按名称取打印配置档，未指定时用默认配置档 (Get a profile by name, or the default profile)"""
+    config = PRINT_CONFIG
+    return config['profiles'].get(name or config['default'])
+
+# --- 请求准入和限流：防止前端异常循环耗尽内存和打印后台句柄 (Admission control and rate limiting, so a runaway frontend cannot exhaust memory and spooler handles) ---
+_admission_lock = threading.Lock()
+_inflight = {'total': 0, 'printers': {}}
+_rate_buckets = {}           # 来源 -> [令牌数, 上次补充时间] (origin -> [tokens, last refill time])
+_job_seconds = {'avg': 2.0}  # 任务耗时的滑动平均，用于估算 retryAfter (Moving average of job time, used for retryAfter)
+_rejected = {'count': 0, 'logged': 0.0}
+
+def _reject(reason, retry_after):
+    # 限流日志每5秒最多一条，避免过载时日志本身成为负担 (At most one throttling log line per 5 seconds)
+    now = datetime.now().timestamp()
+    _rejected['count'] += 1
+    if now - _rejected['logged'] >= 5:
+        log(f'请求过多，已拒绝 {_rejected["count"]} 个打印请求：{reason}')
+        _rejected['count'], _rejected['logged'] = 0, now
+    retry_after = max(1, math.ceil(retry_after))
+    return {'status': 'busy', 'message': f'{reason}，请 {retry_after} 秒后重试。', 'retryAfter': retry_after}
+
+def spooled_jobs(printer_name):
+    """该打印机已交给打印后台、尚未结束的跟踪任务数 (Tracked jobs handed to the spooler for this printer that are not final yet)"""
+    with _spool_lock:
+        return sum(1 for j in TRACKED_JOBS.values() if not j['final'] and j['printer'] == printer_name)
+
+def admit_job(printer_key, origin):
+    """检查来源限流、全局并发和单打印机排队上限，通过返回 None，否则返回 busy 响应 (Check the origin rate limit, global in-flight and per-printer limits; None if admitted, else a busy response)"""
+    limits = PRINT_CONFIG['limits']
+    now = datetime.now().timestamp()
+    # 已在系统打印队列中的任务也占用该打印机的名额 (Jobs already waiting in the Windows spooler count against the printer too)
+    spooled = spooled_jobs(printer_key)
+    with _admission_lock:
+        if origin is not None and limits['ratePerSecond'] > 0:
+            bucket = _rate_buckets.get(origin)
+            if bucket is None:
+                if len(_rate_buckets) > 1000:
+                    # 清理已补满的闲置来源 (Drop idle origins whose buckets are full)
+                    for key in [k for k, b in _rate_buckets.items() if now - b[1] > limits['burst'] / limits['ratePerSecond']]:
+                        del _rate_buckets[key]
+                bucket = _rate_buckets[origin] = [float(limits['burst']), now]
+            bucket[0] = min(float(limits['burst']), bucket[0] + (now - bucket[1]) * limits['ratePerSecond'])
+            bucket[1] = now
+            if bucket[0] < 1:
+                return _reject(f'来源 {origin} 请求过于频繁', (1 - bucket[0]) / limits['ratePerSecond'])
+            bucket[0] -= 1
+        if _inflight['total'] >= limits['maxInflight']:
+            return _reject(f'同时进行的打印任务已达上限 {limits["maxInflight"]}', _job_seconds['avg'])
+        queued = _inflight['printers'].get(printer_key, 0) + spooled
+        if queued >= limits['maxPerPrinter']:
+            return _reject(f'打印机 {printer_key or "默认打印机"} 排队任务已达上限 {limits["maxPerPrinter"]}',
+                           _job_seconds['avg'] * (queued - limits['maxPerPrinter'] + 1))
+        _inflight['total'] += 1
+        _inflight['printers'][printer_key] = _inflight['printers'].get(printer_key, 0) + 1
+    return None
+
+def release_job(printer_key, started):
+    with _admission_lock:
+        _inflight['total'] -= 1
+        left = _inflight['printers'].get(printer_key, 1) - 1
+        if left > 0:
+            _inflight['printers'][printer_key] = left
+        else:
+            _inflight['printers'].pop(printer_key, None)
+        _job_seconds['avg'] = 0.8 * _job_seconds['avg'] + 0.2 * (datetime.now().timestamp() - started)
+
+def parse_page_range(page_range):
+    """校验页码范围，如 "1-3,5"，返回 [(起始页, 结束页)]，不展开页码 (Validate a page range such as "1-3,5" into [(first, last)] spans without expanding it)"""
+    spans = []
+    total = 0
+    for part in page_range.replace(' ', '').split(','):
+        first, dash, last = part.partition('-')
+        if not first.isdigit() or (dash and not last.isdigit()) or len(first) > 6 or len(last) > 6:
+            raise ValueError(f'页码范围格式错误：{page_range}')
+        first, last = int(first), int(last or first)
+        if first < 1 or last < first:
+            raise ValueError(f'页码范围格式错误：{page_range}')
+        total += last - first + 1
+        if total > MAX_PAGES:
+            raise ValueError(f'页码范围超过 {MAX_PAGES} 页：{page_range}')
+        spans.append((first, last))
+    return spans
+
+def count_pdf_pages(path):
+    """粗略统计PDF页数，失败返回0 (Roughly count PDF pages, 0 on failure)"""
+    import re
+    try:
+        with open(path, 'rb') as f:
+            return len(re.findall(rb'/Type\s*/Page(?![a-zA-Z])', f.read()))
+    except OSError:
+        return 0
+
+def copy_args(backend, pdf_path, copies, page_range, collate, spans):
+    """生成份数和页码参数，一次提交完成多份打印；无法按要求打印时抛出 ValueError (Build copy/page arguments so all copies go in one submission; ValueError if the request cannot be honoured)"""
+    if copies > 1 and not collate and not backend['collate']:
+        # 不逐份：展开为 1,1,2,2,... 的页序列，单次提交 (Uncollated: expand to a 1,1,2,2,... page sequence in one submission)
+        if spans:
+            count = sum(last - first + 1 for first, last in spans)
+        else:
+            count = count_pdf_pages(pdf_path)
+            if count == 0:
+                raise ValueError('无法识别PDF页数，不能按不逐份方式打印。建议：传 pageRange 指定页码，或改为逐份打印 (collate: true)')
+            spans = [(1, count)]
+        if count * copies > MAX_PAGES:
+            raise ValueError(f'不逐份打印共 {count * copies} 页，超过上限 {MAX_PAGES} 页。建议：减少份数或改为逐份打印')
+        if count > 1:
+            return [backend['pages'].format(','.join(str(p) for first, last in spans
+                                                     for p in range(first, last + 1) for _ in range(copies)))]
+    args = []
+    if copies > 1:
+        args.append(backend['copies'].format(copies))
+        if backend['collate']:
+            args.append(backend['collate'].format(1 if collate else 0))
+    if page_range:
+        args.append(backend['pages'].format(page_range.replace(' ', '')))
+    return args
+
+def _set_busy(flag):
+    """记录进行中的任务数并通知界面 (Track the number of running jobs and notify the GUI)"""
+    global _busy_jobs
+    with _gui_lock:
+        _busy_jobs += 1 if flag else -1
+        count = _busy_jobs
+    emit_gui_event('busy', count)
+
+def _default_printer(source, reason):
+    try:
+        name = win32print.GetDefaultPrinter()
+        log(f'{reason}{source}: {repr(name)}')
+        return name
+    except Exception as e:
+        log(f'获取系统默认打印机失败{source}：{e}，自动补 ""')
+        return ""
+
+def resolve_printer(printer_name, profile, source=''):
+    """确定实际的打印机名称 (Determine the actual printer name)"""
+    if printer_name is not None:
+        pn_from_request = printer_name.strip()
+        if pn_from_request: # If frontend provided a non-empty printer name (如果前端提供了非空的打印机名称)
+            # Validate if it's a real printer name, not a mis-sent paper size argument (验证它是否是真实的打印机名称，而不是错误发送的纸张尺寸参数)
+            if pn_from_request.lower().startswith('/papersize=') or pn_from_request.lower().startswith('/s='):
+                log(f'警告{source}: 前端发送了无效的打印机名，包含纸张尺寸参数: {repr(pn_from_request)}。将忽略此值并尝试使用默认打印机。')
+                return profile['printer'] or _default_printer(source, '已回退到系统默认打印机')
+            actual_printer_name = profile['printerMap'].get(pn_from_request, pn_from_request)
+            if actual_printer_name not in get_printers():
+                log(f'打印机名称无效{source}：{actual_printer_name}。请检查打印机是否连接、名称是否正确。')
+                raise Exception(f'打印机名称无效：{actual_printer_name}。建议：检查打印机连接和名称。')
+            return actual_printer_name
+    if profile['printer']:
+        return profile['printer']
+    if printer_name is not None: # printerName was provided but empty (printerName已提供但为空)
+        return _default_printer(source, '前端未传有效 printerName 字段，自动获取系统默认打印机')
+    return _default_printer(source, '前端未传 printerName 字段，自动获取系统默认打印机')
+
+def admission_key(printer_name, profile):
+    """准入按实际打印机计数：与 resolve_printer 结果一致，但不枚举打印机 (Admission counts per physical printer: same result as resolve_printer, without enumerating printers)"""
+    name = (printer_name or '').strip()
+    if name.lower().startswith(('/papersize=', '/s=')):
+        name = ''
+    name = profile['printerMap'].get(name, name) if name else profile['printer']
+    if name:
+        return name
+    try:
+        return win32print.GetDefaultPrinter()
+    except Exception:
+        return ''
+
+def process_print_job(data, source='', origin=None):
+    """HTTP 和 WebSocket 共用的打印流程，返回 (响应, HTTP状态码) (Shared print flow for HTTP and WebSocket, returns (response, HTTP status))
+
+    origin 为请求来源，用于按来源限流；为 None 时不做来源限流 (origin is used for per-origin rate limiting; None skips it)
+    """
+    resp, code = _run_print_job(data, source, origin)
+    emit_gui_event('result', {
+        'jobId': resp.get('jobId'), 'status': resp.get('status'), 'time': datetime.now().strftime('%H:%M:%S'),
+        'printer': resp.get('printer') or data.get('printerName') or '', 'pdfUrl': str(data.get('pdfUrl') or data.get('PdfUrl') or ''),
+    })
+    return resp, code
+
+def _run_print_job(data, source, origin):
+    global is_printing
+    if not PRINT_ALLOWED or PRINT_PAUSED:
+        log('打印被暂停或禁止')
+        return {'status': 'error', 'message': '打印被暂停或禁止'}, 403
+
+    pdf_url = data.get('pdfUrl') or data.get('PdfUrl')
+    printer_name = data.get('printerName')
+    profile_name = data.get('profile')
+    copies = data.get('copies')
+    page_range = data.get('pageRange')
+    collate = data.get('collate', True)
+
+    # 参数类型校验 (Parameter type validation)
+    if not isinstance(pdf_url, str) or (printer_name is not None and not isinstance(printer_name, str)) \
+            or (profile_name is not None and not isinstance(profile_name, str)) \
+            or (copies is not None and (not isinstance(copies, int) or isinstance(copies, bool))) \
+            or (page_range is not None and not isinstance(page_range, str)) or not isinstance(collate, bool):
+        log(f'参数类型错误，请检查接口调用方式。{source}')
+        return {'status': 'error', 'message': '参数类型错误，请检查接口调用方式。'}, 400
+
+    if not pdf_url:
+        log('打印失败：未提供pdfUrl。建议：检查接口调用参数。')
+        return {'status': 'error', 'message': 'pdfUrl required。建议：检查接口参数。'}, 400
+
+    # 任务开始时取定配置档，配置热加载不影响进行中的任务 (Take the profile once; hot reload does not affect this job)
+    profile = get_profile(profile_name)
+    if profile is None:
+        log(f'打印失败：打印配置档不存在：{profile_name}')
+        return {'status': 'error', 'message': f'打印配置档不存在：{profile_name}。建议：检查 {os.path.basename(CONFIG_FILE)}。'}, 400
+
+    copies = profile['copies'] if copies is None else copies
+    if not 1 <= copies <= MAX_COPIES:
+        log(f'打印失败：份数超出范围：{copies}')
+        return {'status': 'error', 'message': f'copies 必须是 1~{MAX_COPIES} 的整数。'}, 400
+    spans = None
+    if page_range:
+        try:
+            spans = parse_page_range(page_range)
+        except ValueError as e:
+            log(f'打印失败：{e}')
+            return {'status': 'error', 'message': f'{e}。示例："1-3,5"。'}, 400
+
+    # 下载和拷贝之前先做准入检查 (Admission check before any download or copy)
+    # 未传打印机和显式传默认打印机算同一台 (Omitting printerName and naming the default printer count as the same printer)
+    printer_key = admission_key(printer_name, profile)
+    busy = admit_job(printer_key, origin)
+    if busy:
+        return busy, 429
+    started = datetime.now().timestamp()
+
+    # 每次都下载，不允许缓存打印 (Download every time, no caching allowed for printing)
+    temp_pdf = None
+    try:
+        is_printing = True
+        _set_busy(True)
+
+        if pdf_url.startswith('http://') or pdf_url.startswith('https://'):
+            temp_pdf = download_pdf(pdf_url)
+        else:
+            temp_pdf = os.path.join(CACHE_DIR, f"{uuid.uuid4()}.pdf")
+            try:
+                shutil.copy(pdf_url, temp_pdf)
+            except Exception as e:
+                log(f'本地PDF拷贝失败{source}：{pdf_url}，错误：{str(e)}。请检查文件路径和权限。')
+                raise Exception(f'本地PDF拷贝失败：{str(e)}。建议：检查文件路径、权限。')
+            clean_cache()
+
+        if not os.path.exists(PDFTOPRINTER_PATH):
+            download_url = 'https://mendelson.org/pdftoprinter.html'  # 示例下载地址，请替换为实际可用链接 (Example download URL, please replace with actual available link)
+            log(f'缺少 PDFtoPrinter.exe，无法打印{source}。请确认该文件与本程序在同一目录。下载地址：{download_url}')
+            raise Exception(f'缺少 PDFtoPrinter.exe，无法打印。建议：将 PDFtoPrinter.exe 放到本程序同目录。下载地址：<a href="{download_url}" target="_blank">点击下载</a>')
+
+        actual_printer_name = resolve_printer(printer_name, profile, source)
+
+        # 参数在加载配置时已预编译，这里只拼接文件、打印机和份数/页码 (Arguments are precompiled at config load; only the file, printer and copies/pages are added here)
+        # If actual_printer_name is empty, PDFtoPrinter.exe might handle it as default.
+        cmd = [PDFTOPRINTER_PATH, temp_pdf, actual_printer_name, *profile['compiledArgs']]
+        try:
+            cmd.extend(copy_args(BACKENDS[profile['backend']], temp_pdf, copies, page_range, collate, spans))
+        except ValueError as e:
+            log(f'打印失败{source}：{pdf_url}，{e}')
+            return {'status': 'error', 'message': str(e), 'cachePath': temp_pdf}, 400
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60, check=False) # check=False to handle non-zero exit codes manually (check=False 以手动处理非零退出代码)
+        except subprocess.TimeoutExpired:
+            log(f'打印超时{source}：{pdf_url}，建议检查打印机连接和状态。')
+            return {'status': 'error', 'message': '打印超时，建议检查打印机连接和状态。'}, 504
+        except OSError as e:
+            log(f'PDFtoPrinter.exe 无法执行{source}，可能被杀毒软件拦截，请恢复文件并添加信任。错误：{e}')
+            return {'status': 'error', 'message': 'PDFtoPrinter.exe 无法执行，可能被杀毒软件拦截，请恢复文件并添加信任。'}, 500
+
+        if result.returncode == 0:
+            log(f'打印成功{source}：{pdf_url} -> {actual_printer_name or "默认打印机"} 配置:{profile["name"]} 纸张:{profile["paperSize"]} 份数:{copies} 页码:{page_range or "全部"} 缓存:{temp_pdf}')
+            # 退出码0只代表已交给打印后台，真实结果由队列跟踪推送 (Exit code 0 only means handed to the spooler; the real outcome is tracked and pushed)
+            job_id = track_spool_job(actual_printer_name, temp_pdf)
+            return {'status': 'ok', 'message': result.stdout, 'cachePath': temp_pdf, 'copies': copies,
+                    'jobId': job_id, 'spoolStatus': 'queued', 'printer': actual_printer_name}, 200
+        # PDF损坏或格式不支持检测 (PDF corrupted or format not supported detection)
+        err_msg = result.stderr.lower()
+        if 'invalid' in err_msg or 'corrupt' in err_msg:
+            log(f'PDF文件损坏或格式不受支持{source}：{pdf_url}。建议重新生成或检查源文件。')
+            return {'status': 'error', 'message': 'PDF文件损坏或格式不受支持，建议重新生成或检查源文件。', 'cachePath': temp_pdf, 'copies': copies}, 200
+        # 如果没有错误信息，可能是未设置默认打印机 (If no error message, it might be that the default printer is not set)
+        if not result.stderr.strip():
+            msg = '打印失败：未检测到默认打印机，或打印机不可用。请在系统设置中设置默认打印机并确保其可用。'
+            log(f'{msg} {pdf_url} 缓存:{temp_pdf}')
+            return {'status': 'error', 'message': msg, 'cachePath': temp_pdf, 'copies': copies}, 200
+        log(f'打印失败{source}：{pdf_url} -> {actual_printer_name or "默认打印机"}，错误：{result.stderr} 缓存:{temp_pdf}。建议：检查打印机状态、纸张、驱动。')
+        return {'status': 'error', 'message': result.stderr + "。建议：检查打印机状态、纸张、驱动。", 'cachePath': temp_pdf, 'copies': copies}, 200
+    except Exception as e:
+        log(f'打印异常{source}：{pdf_url}，错误：{str(e)}。如多次出现此类错误，请联系技术支持。')
+        return {'status': 'error', 'message': str(e) + "。如多次出现此类错误，请联系技术支持。"}, 200
+    finally:
+        is_printing = False
+        _set_busy(False)
+        release_job(printer_key, started)
 
 @app.route('/print', methods=['POST'])
 def print_pdf():
-    global PRINT_ALLOWED, PRINT_PAUSED, is_printing
     try:
-        if not PRINT_ALLOWED or PRINT_PAUSED:
-            log('打印被暂停或禁止')
-            return jsonify({'status': 'error', 'message': '打印被暂停或禁止'}), 403
-        
-        data = request.json
-        pdf_url = data.get('pdfUrl')
-        printer_name = data.get('printerName')
-        
-        # 参数类型校验 (Parameter type validation)
-        if not isinstance(pdf_url, str) or (printer_name is not None and not isinstance(printer_name, str)):
-            log('参数类型错误，请检查接口调用方式。')
-            return jsonify({'status': 'error', 'message': '参数类型错误，请检查接口调用方式。'}), 400
-        
-        # 强制所有打印任务都用 100*150mm 纸张 (Force all print tasks to use 100x150mm paper)
-        paper_size = '100x150'
-        paper_size_arg = f'/s"{paper_size}"' # Use /s flag and quote the size value (使用 /s 标志并引用尺寸值)
-
-        if not pdf_url:
-            log('打印失败：未提供pdfUrl。建议：检查接口调用参数。')
-            return jsonify({'status': 'error', 'message': 'pdfUrl required。建议：检查接口参数。'}), 400
-        
-        # 每次都下载，不允许缓存打印 (Download every time, no caching allowed for printing)
+        resp, code = process_print_job(request.json, origin=request.headers.get('Origin') or request.remote_addr)
+        if code == 429:
+            return jsonify(resp), code, {'Retry-After': str(resp['retryAfter'])}
+        return jsonify(resp), code
+    except Exception as e:
+        log(f'未知错误：{str(e)}')
+        return jsonify({'status': 'error', 'message': f'未知错误：{str(e)}'})
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    """列出当前可用的打印配置档 (List the currently loaded print profiles)"""
+    config = PRINT_CONFIG
+    profiles = [{k: p[k] for k in ('name', 'paperSize', 'copies', 'orientation', 'backend', 'dpi', 'printer')}
+                for p in config['profiles'].values()]
+    return jsonify({'status': 'ok', 'default': config['default'], 'profiles': profiles})
+
+# --- 打印队列跟踪：以打印后台处理程序中的状态作为真实结果 (Spool tracking: report the real outcome from the print spooler) ---
+SPOOL_POLL_INTERVAL = 0.5    # 有任务跟踪时的轮询间隔，秒 (Poll interval while jobs are tracked, seconds)
+SPOOL_MATCH_TIMEOUT = 10     # 超过此时间仍未在队列中找到任务则判为 unknown (Mark as unknown if never seen in the queue within this time)
+SPOOL_TRACK_TIMEOUT = 600    # 最长跟踪时间 (Maximum tracking time)
+SPOOL_KEEP_FINISHED = 200    # 保留的已结束任务数 (Number of finished jobs kept for queries)
+SPOOL_FINAL_STATES = ('printed', 'error', 'unknown', 'timeout')
+
+def win32_spool_jobs(printer_name):
+    """读取打印机队列中的任务，返回统一格式 (Read jobs in a printer queue in a normalized form)"""
+    handle = win32print.OpenPrinter(printer_name)
+    try:
+        jobs = win32print.EnumJobs(handle, 0, -1, 1)
+    finally:
+        win32print.ClosePrinter(handle)
+    return [{
+        'id': j['JobId'],
+        'document': j.get('pDocument') or '',
+        'status': j.get('Status', 0),
+        'pagesPrinted': j.get('PagesPrinted', 0),
+        'totalPages': j.get('TotalPages', 0),
+    } for j in jobs]
+
+# 可替换的队列读取函数，签名: (printer_name) -> [{'id', 'document', 'status', 'pagesPrinted', 'totalPages'}]
+# (Replaceable spool reader; the Linux benchmark uses it against the fake win32print)
+SPOOLER_BACKEND = win32_spool_jobs
+
+TRACKED_JOBS = {}
+_job_listeners = []
+_spool_lock = threading.Lock()
+_spool_wakeup = threading.Event()
+_spool_new_job = threading.Event()
+_spool_thread = None
+_spool_errors = {}  # 打印机 -> 最近一次读取队列的错误 (printer -> last queue read error)
+
+def spool_state(status):
+    """把 JOB_STATUS_* 位映射为 queued/printing/printed/error/paper-out；只有删除中标志时返回 None，表示保持原状态
+    (Map JOB_STATUS_* bits to a job state; None when only the deleting flags are set, meaning keep the previous state)
+    """
+    # 打印成功的任务最后也会带删除中标志，所以先判断已打印 (Successful jobs also end with the deleting flag, so check printed first)
+    if status & (win32print.JOB_STATUS_PRINTED | win32print.JOB_STATUS_COMPLETE):
+        return 'printed'
+    if status & win32print.JOB_STATUS_PAPEROUT:
+        return 'paper-out'
+    if status & (win32print.JOB_STATUS_ERROR | win32print.JOB_STATUS_OFFLINE | win32print.JOB_STATUS_BLOCKED_DEVQ
+                 | win32print.JOB_STATUS_USER_INTERVENTION):
+        return 'error'
+    if status & (win32print.JOB_STATUS_DELETING | win32print.JOB_STATUS_DELETED):
+        return None
+    if status & (win32print.JOB_STATUS_PRINTING | win32print.JOB_STATUS_SPOOLING):
+        return 'printing'
+    return 'queued'
+
+def _job_event(job):
+    return {k: job[k] for k in ('jobId', 'printer', 'state', 'final', 'spoolJobId', 'pagesPrinted', 'totalPages', 'updatedAt')}
+
+def _take_notice(job):
+    """须在 _spool_lock 内调用：生成事件并取出回调，任务结束时清空单任务订阅 (Call under _spool_lock: build the event and take the callbacks; per-job listeners are cleared once final)"""
+    callbacks = list(job['listeners']) + list(_job_listeners)
+    if job['final']:
+        job['listeners'] = []
+    return dict(_job_event(job), method='jobstatus', document=job['document']), callbacks
+
+def _notify_job(event, callbacks):
+    """在锁外调用回调，回调可能阻塞或再次订阅 (Run callbacks outside the lock; they may block or subscribe again)"""
+    document = event.pop('document')
+    for callback in callbacks:
         try:
-            is_printing = True
-            if hasattr(start_gui, 'set_tray_blink'):
-                start_gui.set_tray_blink(True)
+            callback(event)
+        except Exception:
+            pass
+    if event['final']:
+        log(f'打印队列结果：{document} -> {event["printer"] or "默认打印机"} 状态:{event["state"]}')
+
+def track_spool_job(printer_name, pdf_path):
+    """登记已交给打印后台的任务并开始跟踪，返回任务ID (Register a job handed to the spooler and start tracking it; returns the job ID)"""
+    global _spool_thread
+    now = datetime.now().timestamp()
+    job = {
+        'jobId': uuid.uuid4().hex, 'printer': printer_name, 'document': os.path.basename(pdf_path),
+        'state': 'queued', 'final': False, 'spoolJobId': None, 'pagesPrinted': 0, 'totalPages': 0,
+        'submittedAt': now, 'updatedAt': now, 'listeners': [],
+    }
+    with _spool_lock:
+        TRACKED_JOBS[job['jobId']] = job
+        finished = [k for k, j in TRACKED_JOBS.items() if j['final']]
+        for k in finished[:max(0, len(finished) - SPOOL_KEEP_FINISHED)]:
+            del TRACKED_JOBS[k]
+        if _spool_thread is None:
+            _spool_thread = threading.Thread(target=spool_tracker_worker, daemon=True)
+            _spool_thread.start()
+        _spool_wakeup.set()
+        _spool_new_job.set()
+    return job['jobId']
+
+def subscribe_job(job_id, callback):
+    """订阅单个任务的状态变化；任务已结束时立即回调一次 (Subscribe to one job's state changes; called once immediately if already final)"""
+    with _spool_lock:
+        job = TRACKED_JOBS.get(job_id)
+        if job is None:
+            return False
+        if not job['final']:
+            job['listeners'].append(callback)
+            return True
+    callback(dict(_job_event(job), method='jobstatus'))
+    return True
+
+def add_job_listener(callback):
+    """订阅所有任务的状态变化 (Subscribe to state changes of all jobs)"""
+    _job_listeners.append(callback)
+
+def remove_job_listener(callback):
+    try:
+        _job_listeners.remove(callback)
+    except ValueError:
+        pass
 
-            if pdf_url.startswith('http://') or pdf_url.startswith('https://'):
-                temp_pdf = download_pdf(pdf_url) # 修复：将 'url' 改为 'pdf_url' (Fix: changed 'url' to 'pdf_url')
-            else:
-                temp_pdf = os.path.join(CACHE_DIR, f"{uuid.uuid4()}.pdf")
-                try:
-                    shutil.copy(pdf_url, temp_pdf)
-                except Exception as e:
-                    log(f'本地PDF拷贝失败：{pdf_url}，错误：{str(e)}。请检查文件路径和权限。')
-                    raise Exception(f'本地PDF拷贝失败：{str(e)}。建议：检查文件路径、权限。')
-                clean_cache()
-            
-            if not os.path.exists(PDFTOPRINTER_PATH):
-                download_url = 'https://mendelson.org/pdftoprinter.html'  # 示例下载地址，请替换为实际可用链接 (Example download URL, please replace with actual available link)
-                log(f'缺少 PDFtoPrinter.exe，无法打印。请确认该文件与本程序在同一目录。下载地址：{download_url}')
-                raise Exception(f'缺少 PDFtoPrinter.exe，无法打印。建议：将 PDFtoPrinter.exe 放到本程序同目录。下载地址：<a href="{download_url}" target="_blank">点击下载</a>')
-            
-            # Determine the actual printer name (确定实际的打印机名称)
-            actual_printer_name = ""
-            if printer_name is not None:
-                pn_from_request = printer_name.strip()
-                if pn_from_request: # If frontend provided a non-empty printer name (如果前端提供了非空的打印机名称)
-                    # Validate if it's a real printer name, not a mis-sent paper size argument (验证它是否是真实的打印机名称，而不是错误发送的纸张尺寸参数)
-                    if pn_from_request.lower().startswith('/papersize=') or pn_from_request.lower().startswith('/s='):
-                        log(f'警告: 前端发送了无效的打印机名，包含纸张尺寸参数: {repr(pn_from_request)}。将忽略此值并尝试使用默认打印机。')
-                        # Fallback to default printer if invalid printerName is sent (如果发送了无效的printerName，则回退到默认打印机)
-                        try:
-                            actual_printer_name = win32print.GetDefaultPrinter()
-                            log(f'已回退到系统默认打印机: {repr(actual_printer_name)}')
-                        except Exception as e:
-                            log(f'获取系统默认打印机失败：{e}，自动补 ""')
-                            actual_printer_name = ""
-                    else:
-                        actual_printer_name = pn_from_request
-                        try:
-                            if actual_printer_name not in get_printers():
-                                log(f'打印机名称无效：{actual_printer_name}。请检查打印机是否连接、名称是否正确。')
-                                raise Exception(f'打印机名称无效：{actual_printer_name}。建议：检查打印机连接和名称。')
-                        except Exception as e:
-                            log(str(e))
-                            raise # Re-raise printer validation error (重新抛出打印机验证错误)
-                else: # printerName was provided but empty (printerName已提供但为空)
-                    try:
-                        actual_printer_name = win32print.GetDefaultPrinter()
-                        log(f'前端未传有效 printerName 字段，自动获取系统默认打印机: {repr(actual_printer_name)}')
-                    except Exception as e:
-                        log(f'获取系统默认打印机失败：{e}，自动补 ""')
-                        actual_printer_name = ""
-            else: # printerName was not provided at all (printerName根本没有提供)
-                try:
-                    actual_printer_name = win32print.GetDefaultPrinter()
-                    log(f'前端未传 printerName 字段，自动获取系统默认打印机: {repr(actual_printer_name)}')
-                except Exception as e:
-                    log(f'获取系统默认打印机失败：{e}，自动补 ""')
-                    actual_printer_name = ""
-
-            # Construct the command list (构造命令列表)
-            cmd = [PDFTOPRINTER_PATH, temp_pdf]
-            
-            # Add the actual printer name (it will be quoted by subprocess.run if it contains spaces and shell=False)
-            # If actual_printer_name is empty, this will append an empty string, which PDFtoPrinter.exe might handle as default.
-            cmd.append(actual_printer_name) 
-
-            # Add the paper size argument as the last argument (将纸张尺寸参数作为最后一个参数添加)
-            cmd.append(paper_size_arg)
-
-            log(f'最终执行命令: {cmd}')
-            
+def _update_job(job, spool_jobs, now):
+    """根据队列快照更新任务状态，返回状态是否变化 (Update a job from a queue snapshot; returns whether it changed)"""
+    entry = None
+    for sj in spool_jobs:
+        if (job['spoolJobId'] is not None and sj['id'] == job['spoolJobId']) or \
+                (job['spoolJobId'] is None and job['document'] in sj['document']):
+            entry = sj
+            break
+    if entry is not None:
+        job['spoolJobId'] = entry['id']
+        job['pagesPrinted'], job['totalPages'] = entry['pagesPrinted'], entry['totalPages']
+        # 出错和删除中都不是最终状态，等任务离开队列再定 (Error and deleting are not final; decide once the job leaves the queue)
+        state = spool_state(entry['status']) or job['state']
+        final = state == 'printed'
+    elif job['spoolJobId'] is not None:
+        # 任务已离开队列：出错后消失视为失败，否则视为已打印 (Job left the queue: failed if it was in error, printed otherwise)
+        state, final = ('error' if job['state'] in ('error', 'paper-out') else 'printed'), True
+    elif now - job['submittedAt'] > SPOOL_MATCH_TIMEOUT:
+        state, final = 'unknown', True
+    else:
+        return False
+    if not final and now - job['submittedAt'] > SPOOL_TRACK_TIMEOUT:
+        state, final = 'timeout', True
+    if state == job['state'] and not final:
+        return False
+    job['state'], job['final'], job['updatedAt'] = state, bool(final), now
+    return True
+
+def _apply_spool_snapshot(jobs, spool_jobs, now):
+    """用一台打印机的队列快照更新任务并推送变化 (Update jobs from one printer's queue snapshot and push the changes)"""
+    # 状态更新和取回调在锁内完成，与 subscribe_job 互斥，避免订阅者错过最终状态
+    # (Update state and take callbacks under the lock, serialized with subscribe_job so no subscriber misses the final event)
+    with _spool_lock:
+        notices = [_take_notice(job) for job in jobs if _update_job(job, spool_jobs, now)]
+    for event, callbacks in notices:
+        _notify_job(event, callbacks)
+
+def spool_tracker_worker():
+    """有任务在跟踪时轮询打印队列，空闲时不轮询 (Poll the spooler only while jobs are tracked)"""
+    while True:
+        _spool_wakeup.wait()
+        with _spool_lock:
+            active = [j for j in TRACKED_JOBS.values() if not j['final']]
+            if not active:
+                _spool_wakeup.clear()
+                continue
+        by_printer = {}
+        for job in active:
+            by_printer.setdefault(job['printer'], []).append(job)
+        now = datetime.now().timestamp()
+        for printer_name, jobs in by_printer.items():
             try:
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=60, check=False) # check=False to handle non-zero exit codes manually (check=False 以手动处理非零退出代码)
-            except subprocess.TimeoutExpired:
-                is_printing = False
-                if hasattr(start_gui, 'set_tray_blink'):
-                    start_gui.set_tray_blink(False)
-                log(f'打印超时：{pdf_url}，建议检查打印机连接和状态。')
-                return jsonify({'status': 'error', 'message': '打印超时，建议检查打印机连接和状态。'}), 504
-            except OSError as e:
-                is_printing = False
-                if hasattr(start_gui, 'set_tray_blink'):
-                    start_gui.set_tray_blink(False)
-                log(f'PDFtoPrinter.exe 无法执行，可能被杀毒软件拦截，请恢复文件并添加信任。错误：{e}')
-                return jsonify({'status': 'error', 'message': 'PDFtoPrinter.exe 无法执行，可能被杀毒软件拦截，请恢复文件并添加信任。'}), 500
-            
-            finally:
-                is_printing = False
-                if hasattr(start_gui, 'set_tray_blink'):
-                    start_gui.set_tray_blink(False)
-
-            if result.returncode == 0:
-                log(f'打印成功：{pdf_url} -> {actual_printer_name or "默认打印机"} 纸张:{paper_size} 缓存:{temp_pdf}')
-                return jsonify({'status': 'ok', 'message': result.stdout, 'cachePath': temp_pdf})
+                spool_jobs = SPOOLER_BACKEND(printer_name or win32print.GetDefaultPrinter())
+            except Exception as e:
+                # 同一打印机同一错误只记录一次，恢复后再记录一次 (Log each printer/error once, and once more on recovery)
+                if _spool_errors.get(printer_name) != str(e):
+                    _spool_errors[printer_name] = str(e)
+                    log(f'读取打印队列失败：{printer_name or "默认打印机"}，错误：{e}。建议：检查打印机是否在线、是否有权限访问。')
+                spool_jobs = []
             else:
-                # PDF损坏或格式不支持检测 (PDF corrupted or format not supported detection)
-                err_msg = result.stderr.lower()
-                if 'invalid' in err_msg or 'corrupt' in err_msg:
-                    log(f'PDF文件损坏或格式不受支持：{pdf_url}。建议重新生成或检查源文件。')
-                    return jsonify({'status': 'error', 'message': 'PDF文件损坏或格式不受支持，建议重新生成或检查源文件。', 'cachePath': temp_pdf})
-                # 如果没有错误信息，可能是未设置默认打印机 (If no error message, it might be that the default printer is not set)
-                if not result.stderr.strip():
-                    msg = '打印失败：未检测到默认打印机，或打印机不可用。请在系统设置中设置默认打印机并确保其可用。'
-                    log(f'{msg} {pdf_url} 缓存:{temp_pdf}')
-                    return jsonify({'status': 'error', 'message': msg, 'cachePath': temp_pdf})
-                log(f'打印失败：{pdf_url} -> {actual_printer_name or "默认打印机"}，错误：{result.stderr} 缓存:{temp_pdf}。建议：检查打印机状态、纸张、驱动。')
-                return jsonify({'status': 'error', 'message': result.stderr + "。建议：检查打印机状态、纸张、驱动。", 'cachePath': temp_pdf})
+                if _spool_errors.pop(printer_name, None) is not None:
+                    log(f'打印队列已恢复读取：{printer_name or "默认打印机"}')
+            _apply_spool_snapshot(jobs, spool_jobs, now)
+        # 新任务提交时立即再轮询一次，避免小任务在两次轮询之间打完 (Poll again right away when a job is added, so short jobs are not missed between polls)
+        _spool_new_job.wait(SPOOL_POLL_INTERVAL)
+        _spool_new_job.clear()
+
+def get_job(job_id):
+    with _spool_lock:
+        job = TRACKED_JOBS.get(job_id)
+        return dict(_job_event(job), document=job['document']) if job else None
+
+def get_queue_stats():
+    """各打印机的队列深度和跟踪中的任务统计 (Per-printer spool queue depth and tracked job counts)"""
+    with _spool_lock:
+        jobs = list(TRACKED_JOBS.values())
+    stats = {}
+    for printer_name in get_printers():
+        try:
+            depth = len(SPOOLER_BACKEND(printer_name))
+        except Exception:
+            depth = None
+        stats[printer_name] = {'queueDepth': depth, 'tracked': 0, 'states': {}}
+    try:
+        default_printer = win32print.GetDefaultPrinter()
+    except Exception:
+        default_printer = ''
+    for job in jobs:
+        entry = stats.setdefault(job['printer'] or default_printer, {'queueDepth': None, 'tracked': 0, 'states': {}})
+        if not job['final']:
+            entry['tracked'] += 1
+        entry['states'][job['state']] = entry['states'].get(job['state'], 0) + 1
+    return stats
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'任务不存在：{job_id}'}), 404
+    return jsonify(dict(job, status='ok'))
+
+@app.route('/queues', methods=['GET'])
+def queue_status():
+    return jsonify({'status': 'ok', 'printers': get_queue_stats()})
+
+# --- 多工位集群：节点模式，主动连接调度服务并执行转发来的任务 (Fleet node mode: connect out to the dispatcher and run forwarded jobs) ---
+FLEET_HEARTBEAT_INTERVAL = 5  # 需与 dispatcher.py 一致 (must match dispatcher.py)
+
+def fleet_settings():
+    fleet = PRINT_CONFIG.get('fleet') or {}
+    import socket
+    return fleet.get('dispatcher'), fleet.get('node') or socket.gethostname(), fleet.get('token') or ''
+
+def is_local_pdf(data):
+    """任务是否引用本机文件；集群转发的任务不允许打印工位本地文件 (Whether the job points at a local file; fleet jobs may not print files from the station's disk)"""
+    pdf_url = (data.get('pdfUrl') or data.get('PdfUrl')) if isinstance(data, dict) else None
+    return bool(pdf_url) and not (isinstance(pdf_url, str) and pdf_url.startswith(('http://', 'https://')))
+
+def fleet_node_load():
+    with _spool_lock:
+        return sum(1 for j in TRACKED_JOBS.values() if not j['final'])
+
+async def fleet_node_session(ws, settings):
+    """一条长连接上并发处理多个任务，并定时上报打印机和负载 (Serve many jobs concurrently over one connection and report printers/load periodically)"""
+    loop = asyncio.get_running_loop()
+    running = {'jobs': 0}
+
+    def push(event):
+        asyncio.run_coroutine_threadsafe(ws.send(json.dumps({'type': 'jobstatus', 'event': event}, ensure_ascii=False)), loop)
+
+    async def run_job(req_id, data, client):
+        running['jobs'] += 1
+        try:
+            await ws.send(json.dumps({'type': 'accepted', 'reqId': req_id}))
+            if is_local_pdf(data):
+                log(f'拒绝集群任务：pdfUrl 不是 http(s) 地址：{data.get("pdfUrl") or data.get("PdfUrl")}')
+                resp = {'status': 'error', 'message': '集群任务的 pdfUrl 必须是 http(s) 地址，不能打印工位本地文件。'}
+            else:
+                # 按调度服务转发的原始客户端限流 (Rate-limit by the original client the dispatcher forwarded)
+                resp, _ = await asyncio.to_thread(process_print_job, data, '(Fleet)', f'fleet:{client}')
+            await ws.send(json.dumps({'type': 'result', 'reqId': req_id, 'resp': resp}, ensure_ascii=False))
+            if resp.get('jobId'):
+                subscribe_job(resp['jobId'], push)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            running['jobs'] -= 1
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(FLEET_HEARTBEAT_INTERVAL)
+            if fleet_settings() != settings:
+                # 配置已修改，断开后按新配置重连 (Config changed; reconnect with the new settings)
+                await ws.close()
+                return
+            printers = await asyncio.to_thread(get_printers)
+            await ws.send(json.dumps({'type': 'heartbeat', 'printers': printers,
+                                      'load': running['jobs'] + fleet_node_load()}, ensure_ascii=False))
+
+    beat = asyncio.ensure_future(heartbeat())
+    tasks = set()
+    try:
+        async for message in ws:
+            msg = json.loads(message)
+            if msg.get('type') == 'job':
+                task = asyncio.ensure_future(run_job(msg.get('reqId'), msg.get('data') or {}, msg.get('client') or ''))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+    finally:
+        beat.cancel()
+
+async def fleet_node_main():
+    backoff = 1
+    connected_url = None
+    last_error = None
+    while True:
+        settings = fleet_settings()
+        url, node_name, token = settings
+        if not url:
+            await asyncio.sleep(FLEET_HEARTBEAT_INTERVAL)
+            continue
+        try:
+            async with websockets.connect(url, max_size=None) as ws:
+                printers = await asyncio.to_thread(get_printers)
+                await ws.send(json.dumps({'type': 'register', 'node': node_name, 'token': token, 'printers': printers,
+                                          'load': fleet_node_load()}, ensure_ascii=False))
+                # 调度服务校验令牌后才确认注册 (The dispatcher confirms registration only after checking the token)
+                reply = json.loads(await asyncio.wait_for(ws.recv(), FLEET_HEARTBEAT_INTERVAL))
+                if reply.get('type') != 'registered':
+                    raise Exception(f'注册未被确认：{reply}')
+                log(f'已连接调度服务：{url}，节点名：{node_name}')
+                connected_url, last_error, backoff = url, None, 1
+                await fleet_node_session(ws, settings)
         except Exception as e:
-            is_printing = False
-            if hasattr(start_gui, 'set_tray_blink'):
-                start_gui.set_tray_blink(False)
-            log(f'打印异常：{pdf_url}，错误：{str(e)}。如多次出现此类错误，请联系技术支持。')
-            return jsonify({'status': 'error', 'message': str(e) + "。如多次出现此类错误，请联系技术支持。"})
+            # 只在断开时记录一次，重连失败不重复写日志 (Log once on disconnect, not on every failed retry)
+            if connected_url:
+                log(f'与调度服务断开：{url}，错误：{e}。将自动重连。')
+                connected_url = None
+            elif str(e) != last_error:
+                log(f'无法接入调度服务：{url}，错误：{e}。建议：检查调度服务地址和 fleet.token。将自动重试。')
+            last_error = str(e)
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+def run_fleet_node():
+    try:
+        asyncio.run(fleet_node_main())
     except Exception as e:
-        log(f'未知错误：{str(e)}')
-        return jsonify({'status': 'error', 'message': f'未知错误：{str(e)}'})
+        log(f'集群节点服务异常退出：{e}')
 
 def run_flask():
     global PORT
@@ -294,11 +1020,34 @@ def run_flask():
  # 原生 WebSocket 服务端实现 (Native WebSocket server implementation)
 import websockets.exceptions
 async def ws_handler(websocket):
-    global PRINT_ALLOWED, PRINT_PAUSED
+    loop = asyncio.get_running_loop()
+    def push(event):
+        # 在跟踪线程中调用，转交给 WebSocket 事件循环发送 (Called from the tracker thread; hand the send over to the WebSocket loop)
+        asyncio.run_coroutine_threadsafe(websocket.send(json.dumps(event, ensure_ascii=False)), loop)
+
+    # 每个连接最多同时处理 wsWindow 个打印任务 (At most wsWindow print jobs per connection at a time)
+    window = asyncio.Semaphore(PRINT_CONFIG['limits']['wsWindow'])
+    origin = websocket.request.headers.get('Origin') or websocket.remote_address[0]
+    jobs = set()
+    subscribed = {'all': False, 'flowcontrol': False}
+
+    async def run_job(data):
+        try:
+            resp, _ = await asyncio.to_thread(process_print_job, data, '(WS)', origin)
+            if 'requestId' in data:
+                resp['requestId'] = data['requestId']
+            await websocket.send(json.dumps(resp))
+            # 只有带 track: true 的任务才推送状态，旧前端会把推送误当成打印结果 (Push status only for jobs sent with track: true; legacy frontends would mistake pushes for print results)
+            if resp.get('jobId') and data.get('track') is True and not subscribed['all']:
+                subscribe_job(resp['jobId'], push)
+        except websockets.exceptions.ConnectionClosed:
+            log('WebSocket 客户端已断开')
+        finally:
+            window.release()
+
     try:
         async for message in websocket:
             print(f"[DEBUG] 收到原始消息: {message}")
-            import json
             import urllib.parse
             # 先尝试URL解码 (First try URL decoding)
             try:
@@ -336,180 +1085,50 @@ async def ws_handler(websocket):
                 printers = get_printers()
                 await websocket.send(json.dumps({'status': 'ok', 'printers': printers}))
                 continue
+            # 获取打印配置档列表 (Get print profile list)
+            if data.get('method') == 'getprofiles':
+                config = PRINT_CONFIG
+                await websocket.send(json.dumps({'method': 'getprofiles', 'status': 'ok', 'default': config['default'],
+                                                 'profiles': list(config['profiles'])}, ensure_ascii=False))
+                continue
 
-            if not PRINT_ALLOWED or PRINT_PAUSED:
-                log('打印被暂停或禁止')
-                await websocket.send(json.dumps({'status': 'error', 'message': '打印被暂停或禁止'}))
+            # 打印队列：查询任务、队列统计、订阅全部任务状态 (Spool: job lookup, queue stats, subscribe to all job states)
+            if data.get('method') == 'getjob':
+                job = get_job(data.get('jobId'))
+                await websocket.send(json.dumps(dict(job, method='getjob', status='ok') if job else
+                                                {'method': 'getjob', 'status': 'error', 'message': '任务不存在'}, ensure_ascii=False))
                 continue
-            pdf_url = data.get('pdfUrl') or data.get('PdfUrl')
-            printer_name = data.get('printerName')
-            
-            # 强制所有打印任务都用 100*150mm 纸张 (Force all print tasks to use 100x150mm paper)
-            paper_size = '100x150'
-            paper_size_arg = f'/s"{paper_size}"' # Use /s flag and quote the size value (使用 /s 标志并引用尺寸值)
-
-            if not pdf_url:
-                log('打印失败：未提供pdfUrl')
-                await websocket.send(json.dumps({'status': 'error', 'message': 'pdfUrl required'}))
+            if data.get('method') == 'getqueues':
+                await websocket.send(json.dumps({'method': 'getqueues', 'status': 'ok', 'printers': await asyncio.to_thread(get_queue_stats)}, ensure_ascii=False))
+                continue
+            if data.get('method') == 'subscribejobs':
+                if not subscribed['all']:
+                    add_job_listener(push)
+                    subscribed['all'] = True
+                await websocket.send(json.dumps({'method': 'subscribejobs', 'status': 'ok'}))
+                continue
+            # 订阅流量控制通知；未订阅的旧前端只会被暂停读取，不会收到额外消息 (Opt in to flow-control notices; legacy clients are only paused, never sent extra messages)
+            if data.get('method') == 'flowcontrol':
+                subscribed['flowcontrol'] = data.get('notify') is not False
+                await websocket.send(json.dumps({'method': 'flowcontrol', 'status': 'ok', 'notify': subscribed['flowcontrol']}))
                 continue
-            try:
-                global is_printing
-                is_printing = True
-                if hasattr(start_gui, 'set_tray_blink'):
-                    start_gui.set_tray_blink(True)
-                
-                # 参数类型校验 (Parameter type validation)
-                if not isinstance(pdf_url, str) or (printer_name is not None and not isinstance(printer_name, str)):
-                    log('参数类型错误，请检查接口调用方式。(WS)')
-                    await websocket.send(json.dumps({'status': 'error', 'message': '参数类型错误，请检查接口调用方式。'}))
-                    is_printing = False
-                    if hasattr(start_gui, 'set_tray_blink'):
-                        start_gui.set_tray_blink(False)
-                    continue
 
-                if pdf_url.startswith('http://') or pdf_url.startswith('https://'):
-                    try:
-                        temp_pdf = download_pdf(pdf_url) # 修复：将 'url' 改为 'pdf_url' (Fix: changed 'url' to 'pdf_url')
-                    except Exception as e:
-                        await websocket.send(json.dumps({'status': 'error', 'message': str(e) + '（WebSocket端）'}))
-                        is_printing = False
-                        if hasattr(start_gui, 'set_tray_blink'):
-                            start_gui.set_tray_blink(False)
-                        continue
-                else:
-                    temp_pdf = os.path.join(CACHE_DIR, f"{uuid.uuid4()}.pdf")
-                    try:
-                        shutil.copy(pdf_url, temp_pdf)
-                    except Exception as e:
-                        log(f'本地PDF拷贝失败(WS)：{pdf_url}，错误：{str(e)}。请检查文件路径和权限。')
-                        await websocket.send(json.dumps({'status': 'error', 'message': f'本地PDF拷贝失败：{str(e)}。建议：检查文件路径、权限。'}))
-                        is_printing = False
-                        if hasattr(start_gui, 'set_tray_blink'):
-                            start_gui.set_tray_blink(False)
-                        continue
-                    clean_cache()
-                
-                if not os.path.exists(PDFTOPRINTER_PATH):
-                    download_url = 'https://www.gridsoft.cn/download/PDFtoPrinter.exe'  # 示例下载地址，请替换为实际可用链接 (Example download URL, please replace with actual available link)
-                    log(f'缺少 PDFtoPrinter.exe，无法打印(WS)。请确认该文件与本程序在同一目录。下载地址：{download_url}')
-                    await websocket.send(json.dumps({
-                        'status': 'error',
-                        'message': f'缺少 PDFtoPrinter.exe，无法打印。建议：将 PDFtoPrinter.exe 放到本程序同目录。下载地址：<a href="{download_url}" target="_blank">点击下载</a>'
-                    }))
-                    is_printing = False
-                    if hasattr(start_gui, 'set_tray_blink'):
-                        start_gui.set_tray_blink(False)
-                    continue
-                
-                # Determine the actual printer name (确定实际的打印机名称)
-                actual_printer_name = ""
-                if printer_name is not None:
-                    pn_from_request = printer_name.strip()
-                    if pn_from_request: # If frontend provided a non-empty printer name (如果前端提供了非空的打印机名称)
-                        # Validate if it's a real printer name, not a mis-sent paper size argument (验证它是否是真实的打印机名称，而不是错误发送的纸张尺寸参数)
-                        if pn_from_request.lower().startswith('/papersize=') or pn_from_request.lower().startswith('/s='):
-                            log(f'警告(WS): 前端发送了无效的打印机名，包含纸张尺寸参数: {repr(pn_from_request)}。将忽略此值并尝试使用默认打印机。')
-                            try:
-                                actual_printer_name = win32print.GetDefaultPrinter()
-                                log(f'已回退到系统默认打印机(WS): {repr(actual_printer_name)}')
-                            except Exception as e:
-                                log(f'获取系统默认打印机失败(WS)：{e}，自动补 ""')
-                                actual_printer_name = ""
-                        else:
-                            actual_printer_name = pn_from_request
-                            try:
-                                if actual_printer_name not in get_printers():
-                                    log(f'打印机名称无效(WS)：{actual_printer_name}。请检查打印机是否连接、名称是否正确。')
-                                    await websocket.send(json.dumps({'status': 'error', 'message': f'打印机名称无效：{actual_printer_name}。建议：检查打印机连接和名称。'}))
-                                    is_printing = False
-                                    if hasattr(start_gui, 'set_tray_blink'):
-                                        start_gui.set_tray_blink(False)
-                                    continue
-                            except Exception as e:
-                                log(str(e))
-                                await websocket.send(json.dumps({'status': 'error', 'message': str(e)}))
-                                is_printing = False
-                                if hasattr(start_gui, 'set_tray_blink'):
-                                    is_printing = False
-                                    if hasattr(start_gui, 'set_tray_blink'):
-                                        start_gui.set_tray_blink(False)
-                                    continue
-                    else: # printerName was provided but empty (printerName已提供但为空)
-                        try:
-                            actual_printer_name = win32print.GetDefaultPrinter()
-                            log(f'前端未传有效 printerName 字段，自动获取系统默认打印机(WS): {repr(actual_printer_name)}')
-                        except Exception as e:
-                            log(f'获取系统默认打印机失败(WS)：{e}，自动补 ""')
-                            actual_printer_name = ""
-                else: # printerName was not provided at all (printerName根本没有提供)
-                    try:
-                        actual_printer_name = win32print.GetDefaultPrinter()
-                        log(f'前端未传 printerName 字段，自动获取系统默认打印机(WS): {repr(actual_printer_name)}')
-                    except Exception as e:
-                        log(f'获取系统默认打印机失败(WS)：{e}，自动补 ""')
-                        actual_printer_name = ""
-
-                # Construct the command list (构造命令列表)
-                cmd = [PDFTOPRINTER_PATH, temp_pdf]
-                cmd.append(actual_printer_name) 
-                cmd.append(paper_size_arg) # Add the paper size argument as the last argument (将纸张尺寸参数作为最后一个参数添加)
-
-                log(f'最终执行命令(WS): {cmd}')
-
-                try:
-                    result = subprocess.run(cmd, capture_output=True, text=True, timeout=60, check=False)
-                except subprocess.TimeoutExpired:
-                    is_printing = False
-                    if hasattr(start_gui, 'set_tray_blink'):
-                        start_gui.set_tray_blink(False)
-                    log(f'打印超时(WS)：{pdf_url}，建议检查打印机连接和状态。')
-                    await websocket.send(json.dumps({'status': 'error', 'message': '打印超时，建议检查打印机连接和状态。'}))
-                    continue
-                except OSError as e:
-                    is_printing = False
-                    if hasattr(start_gui, 'set_tray_blink'):
-                        start_gui.set_tray_blink(False)
-                    log(f'PDFtoPrinter.exe 无法执行(WS)，可能被杀毒软件拦截，请恢复文件并添加信任。错误：{e}')
-                    await websocket.send(json.dumps({'status': 'error', 'message': 'PDFtoPrinter.exe 无法执行，可能被杀毒软件拦截，请恢复文件并添加信任。'}))
-                    continue
-                
-                finally:
-                    is_printing = False
-                    if hasattr(start_gui, 'set_tray_blink'):
-                        start_gui.set_tray_blink(False)
-
-                if result.returncode == 0:
-                    log(f'打印成功(WS)：{pdf_url} -> {printer_name or "默认打印机"} 纸张:{paper_size} 缓存:{temp_pdf}')
-                    await websocket.send(json.dumps({'status': 'ok', 'message': result.stdout, 'cachePath': temp_pdf}))
-                else:
-                    err_msg = result.stderr.lower()
-                    if 'invalid' in err_msg or 'corrupt' in err_msg:
-                        log(f'PDF文件损坏或格式不受支持(WS)：{pdf_url}。建议重新生成或检查源文件。')
-                        await websocket.send(json.dumps({'status': 'error', 'message': 'PDF文件损坏或格式不受支持，建议重新生成或检查源文件。', 'cachePath': temp_pdf}))
-                        continue
-                    # 如果没有错误信息，可能是未设置默认打印机 (If no error message, it might be that the default printer is not set)
-                    if not result.stderr.strip():
-                        msg = '打印失败：未检测到默认打印机，或打印机不可用。请在系统设置中设置默认打印机并确保其可用。'
-                        log(f'{msg} {pdf_url} 缓存:{temp_pdf}')
-                        await websocket.send(json.dumps({'status': 'error', 'message': msg, 'cachePath': temp_pdf}))
-                        continue
-                    log(f'打印失败(WS)：{pdf_url} -> {printer_name or "默认打印机"}，错误：{result.stderr} 缓存:{temp_pdf}。建议：检查打印机状态、纸张、驱动。')
-                    await websocket.send(json.dumps({'status': 'error', 'message': result.stderr + "。建议：检查打印机状态、纸张、驱动。", 'cachePath': temp_pdf}))
-            except websockets.exceptions.ConnectionClosed:
-                log('WebSocket 客户端已断开')
-                break
-            except Exception as e:
-                is_printing = False
-                if hasattr(start_gui, 'set_tray_blink'):
-                    start_gui.set_tray_blink(False)
-                log(f'打印异常(WS)：{pdf_url}，错误：{str(e)}。如多次出现此类错误，请联系技术支持。')
-                try:
-                    await websocket.send(json.dumps({'status': 'error', 'message': str(e) + "。如多次出现此类错误，请联系技术支持。"}))
-                except websockets.exceptions.ConnectionClosed:
-                    log('WebSocket 客户端已断开')
-                    break
+            # 流量控制：窗口满时暂停读取，服务端接收队列满后由 TCP 反压让客户端暂停发送，而不是无限缓存
+            # (Flow control: stop reading while the window is full; once the bounded receive queue fills, TCP backpressure pauses the client instead of buffering without bound)
+            if window.locked() and subscribed['flowcontrol']:
+                # 通知不带 status 字段，不会被当成打印结果 (Notices carry no status field, so they cannot pass for a print result)
+                await websocket.send(json.dumps({'method': 'flowcontrol', 'state': 'paused'}))
+                await window.acquire()
+                await websocket.send(json.dumps({'method': 'flowcontrol', 'state': 'resumed'}))
+            else:
+                await window.acquire()
+            task = asyncio.ensure_future(run_job(data))
+            jobs.add(task)
+            task.add_done_callback(jobs.discard)
     except Exception as e:
         log(f'WebSocket连接异常：{str(e)}')
+    finally:
+        remove_job_listener(push)
 
 def start_ws_server():
     print(f"[DEBUG] WebSocket服务即将启动，监听端口: {WS_PORT}")
@@ -517,7 +1136,7 @@ def start_ws_server():
     try:
         async def ws_main():
             try:
-                async with websockets.serve(ws_handler, '127.0.0.1', WS_PORT):
+                async with websockets.serve(ws_handler, '127.0.0.1', WS_PORT, max_queue=WS_MAX_QUEUE):
                     print(f"[DEBUG] WebSocket服务已启动，监听端口: {WS_PORT}")
                     await asyncio.Future()  # run forever
             except OSError as e:
@@ -536,33 +1155,7 @@ def open_printer_settings():
         messagebox.showerror("错误", f"无法打开打印机设置: {e}")
 
 def start_gui():
-    # 托盘闪烁控制 (Tray blinking control)
-    tray_blinking = {'flag': False, 'thread': None}
-    def tray_blink_worker():
-        import time
-        state = False
-        while tray_blinking['flag']:
-            if tray_icon_instance:
-                tray_icon_instance.icon = tray_icons_pil['on'] if state else tray_icons_pil['off']
-            state = not state
-            time.sleep(0.5)
-        # 恢复为当前状态 (Restore to current state)
-        if tray_icon_instance:
-            if PRINT_ALLOWED and not PRINT_PAUSED:
-                tray_icon_instance.icon = tray_icons_pil['on']
-            else:
-                tray_icon_instance.icon = tray_icons_pil['off']
-
-    def set_tray_blink(blink):
-        if blink:
-            if not tray_blinking['flag']:
-                tray_blinking['flag'] = True
-                tray_blinking['thread'] = threading.Thread(target=tray_blink_worker, daemon=True)
-                tray_blinking['thread'].start()
-        else:
-            tray_blinking['flag'] = False
-    start_gui.set_tray_blink = set_tray_blink
-    global root, status_icon_label, status_text_label, port_value_label, ws_port_value_label, logbox, tray_icon_instance, tk_icons, PRINT_ALLOWED, PRINT_PAUSED, tray_icons_pil
+    global root, status_icon_label, status_text_label, port_value_label, ws_port_value_label, logbox, tray_icon_instance, tk_icons, PRINT_ALLOWED, PRINT_PAUSED, tray_icons_pil, gui_event_handler
     root = tk.Tk()
     # 初始窗口标题 (Initial window title)
     def update_title():
@@ -571,7 +1164,7 @@ def start_gui():
         else:
             root.title("本地静默打印服务 - 打印已暂停")
     update_title()
-    root.geometry("600x500")
+    root.geometry("600x720")
     root.protocol("WM_DELETE_WINDOW", lambda: root.withdraw())  # 关闭按钮只隐藏窗口 (Close button only hides window)
 
     # 生成绿色/灰色圆形图标（PIL Image） (Generate green/gray circular icon (PIL Image))
@@ -583,8 +1176,19 @@ def start_gui():
 
     tray_icons_pil = {
         'on': make_icon_pil((0, 255, 0)),
-        'off': make_icon_pil((180, 180, 180))
+        'off': make_icon_pil((180, 180, 180)),
+        'busy': make_icon_pil((255, 170, 0))  # 打印中 (Printing)
     }
+    # 托盘图标只在状态变化时替换，不再用线程闪烁 (The tray icon is only swapped on state changes, no blink thread)
+    tray_state = {'icon': 'on', 'busy': 0}
+    def refresh_tray_icon():
+        if tray_state['busy'] > 0:
+            key = 'busy'
+        else:
+            key = 'on' if PRINT_ALLOWED and not PRINT_PAUSED else 'off'
+        if tray_icon_instance and key != tray_state['icon']:
+            tray_icon_instance.icon = tray_icons_pil[key]
+            tray_state['icon'] = key
 
     # Tkinter用PhotoImage生成小圆点 (Tkinter uses PhotoImage to generate small dots)
     def make_icon_tk(color, size=18):
@@ -618,13 +1222,12 @@ def start_gui():
 
     # 日志显示 (Log display)
     tk.Label(root, text="实时打印日志:").place(x=20, y=170)
-    logbox = tk.Text(root, height=15, width=70)
+    logbox = tk.Text(root, height=12, width=70)
     logbox.place(x=20, y=200)
 
     def clear_log():
         try:
-            with open(LOG_FILE, 'w', encoding='utf-8') as f:
-                f.write("")
+            clear_log_file()
             logbox.delete(1.0, tk.END)
         except Exception as e:
             messagebox.showerror("错误", f"无法清空日志: {e}")
@@ -663,7 +1266,7 @@ def start_gui():
     tk.Button(root, text="清空日志", width=btn_width, command=clear_log).place(x=base_x + 3*((btn_width+2)*7 + btn_gap), y=y_pos)
     start_print()
 
-    tk.Label(root, text="缓存PDF目录(仅供核查):").place(x=20, y=460)
+    tk.Label(root, text="缓存PDF目录(仅供核查):").place(x=20, y=680)
     def open_cache_dir():
         abs_path = os.path.abspath(CACHE_DIR)
         if not os.path.exists(abs_path):
@@ -672,19 +1275,102 @@ def start_gui():
             os.startfile(abs_path)
         except Exception as e:
             messagebox.showerror("错误", f"无法打开缓存目录: {e}")
-    tk.Button(root, text="打开缓存目录", command=open_cache_dir).place(x=160, y=455)
+    tk.Button(root, text="打开缓存目录", command=open_cache_dir).place(x=160, y=675)
 
-    def refresh_log():
-        try:
-            with open(LOG_FILE, 'r', encoding='utf-8') as f:
-                lines = f.readlines()[-100:]
-            logbox.delete(1.0, tk.END)
-            for line in lines:
-                logbox.insert(tk.END, line)
-        except:
-            pass
-        root.after(2000, refresh_log)
-    refresh_log()
+    # 启动时加载一次已有日志，之后只追加 (Load the existing log once at startup; append only afterwards)
+    try:
+        with open(LOG_FILE, 'r', encoding='utf-8') as f:
+            logbox.insert(tk.END, ''.join(f.readlines()[-LOG_VIEW_MAX_LINES:]))
+        logbox.see(tk.END)
+    except Exception:
+        pass
+
+    # 任务列表和统计 (Job list and stats)
+    stats_label = tk.Label(root, text="", fg="#0055cc")
+    stats_label.place(x=20, y=415)
+    job_tree = ttk.Treeview(root, columns=('time', 'printer', 'file', 'state'), show='headings', height=9)
+    for col, text, width in (('time', '时间', 70), ('printer', '打印机', 150), ('file', '文件', 230), ('state', '状态', 90)):
+        job_tree.heading(col, text=text)
+        job_tree.column(col, width=width, anchor='w')
+    job_tree.place(x=20, y=440)
+    job_states = {'queued': '排队中', 'printing': '打印中', 'printed': '已打印', 'error': '出错',
+                  'paper-out': '缺纸', 'unknown': '未知', 'timeout': '超时', 'failed': '提交失败'}
+    stats = {'busy': 0, 'pending': set(), 'early': {}, 'printed': 0, 'errors': 0, 'rejected': 0, 'done': collections.deque(), 'tick': False}
+
+    def refresh_stats():
+        now = datetime.now().timestamp()
+        while stats['done'] and now - stats['done'][0] > 60:
+            stats['done'].popleft()
+        stats_label.config(text=f"进行中 {stats['busy']}   队列中 {len(stats['pending'])}   已打印 {stats['printed']}   "
+                                f"失败 {stats['errors']}   限流 {stats['rejected']}   最近1分钟 {len(stats['done'])} 张")
+        # 最近1分钟有完成的任务时才定时刷新，空闲时没有定时器 (Only tick while the 1-minute window is non-empty; no timer when idle)
+        if stats['done'] and not stats['tick']:
+            stats['tick'] = True
+            root.after(5000, stats_tick)
+    def stats_tick():
+        stats['tick'] = False
+        refresh_stats()
+
+    def add_job_row(iid, values):
+        job_tree.insert('', 0, iid=iid, values=values)
+        rows = job_tree.get_children()
+        if len(rows) > JOB_VIEW_MAX_ROWS:
+            job_tree.delete(*rows[JOB_VIEW_MAX_ROWS:])
+
+    def finish_job(job_id, state):
+        stats['pending'].discard(job_id)
+        stats['printed' if state == 'printed' else 'errors'] += 1
+        stats['done'].append(datetime.now().timestamp())
+
+    def handle_gui_events(events):
+        """批量应用一个合并窗口内的事件，每类控件最多重绘一次 (Apply one coalescing window of events; each widget repaints at most once)"""
+        lines = []
+        changed = False
+        for kind, data in events:
+            if kind == 'log':
+                lines.append(data)
+            elif kind == 'busy':
+                stats['busy'] = tray_state['busy'] = data
+                changed = True
+            elif kind == 'result':
+                changed = True
+                name = os.path.basename(data['pdfUrl'].split('?')[0]) or data['pdfUrl']
+                if data['status'] == 'ok' and data['jobId']:
+                    # 队列状态可能先于提交结果到达 (A spool event may arrive before the submit result)
+                    early = stats['early'].pop(data['jobId'], None)
+                    state = early['state'] if early else 'queued'
+                    add_job_row(data['jobId'], (data['time'], data['printer'] or '默认打印机', name, job_states.get(state, state)))
+                    if early and early['final']:
+                        finish_job(data['jobId'], state)
+                    else:
+                        stats['pending'].add(data['jobId'])
+                elif data['status'] == 'busy':
+                    # 限流拒绝只计数不加行，过载时不刷屏 (Admission rejections are counted, not listed, so overload does not flood the list)
+                    stats['rejected'] += 1
+                else:
+                    stats['errors'] += 1
+                    stats['done'].append(datetime.now().timestamp())
+                    add_job_row(None, (data['time'], data['printer'] or '默认打印机', name, job_states['failed']))
+            elif kind == 'jobstatus':
+                job_id = data['jobId']
+                if job_id not in stats['pending']:
+                    stats['early'][job_id] = data
+                    continue
+                if job_tree.exists(job_id):
+                    job_tree.set(job_id, 'state', job_states.get(data['state'], data['state']))
+                if data['final']:
+                    finish_job(job_id, data['state'])
+                changed = True
+        if lines:
+            logbox.insert(tk.END, ''.join(lines))
+            count = int(logbox.index('end-1c').split('.')[0])
+            if count > LOG_VIEW_MAX_LINES:
+                logbox.delete('1.0', f'{count - LOG_VIEW_MAX_LINES + 1}.0')
+            logbox.see(tk.END)
+        if changed:
+            refresh_stats()
+            refresh_tray_icon()
+    refresh_stats()
 
     # --- GUI中的开机自启动开关 (Auto-start switch in GUI) ---
     autostart_var = tk.BooleanVar(value=is_autostart_enabled())
@@ -718,15 +1404,14 @@ def start_gui():
             status_text_label.config(text="打印已启动 " + tip, fg="#00b300")
             root.title("本地静默打印服务 - 打印已启动 " + tip)
             if tray_icon_instance:
-                tray_icon_instance.icon = tray_icons_pil['on']
                 tray_icon_instance.title = "本地静默打印服务 - 打印已启动 " + tip
         else:
             status_icon_label.config(image=tk_icons['off'])
             status_text_label.config(text="打印已暂停 " + tip, fg="#888888")
             root.title("本地静默打印服务 - 打印已暂停 " + tip)
             if tray_icon_instance:
-                tray_icon_instance.icon = tray_icons_pil['off']
                 tray_icon_instance.title = "本地静默打印服务 - 打印已暂停 " + tip
+        refresh_tray_icon()
 
     # 托盘相关 (Tray related)
     def on_show_window(icon, item):
@@ -792,6 +1477,10 @@ def start_gui():
     # 启动时默认更新一次状态 (Update status once on startup)
     update_gui_status()
 
+    # 接入服务核心的事件队列 (Hook up the service core's event queue)
+    gui_event_handler = handle_gui_events
+    add_job_listener(lambda event: emit_gui_event('jobstatus', event))
+
     root.mainloop()
 
 if __name__ == '__main__':
@@ -803,9 +1492,12 @@ if __name__ == '__main__':
         pass
     # 先启动GUI（主线程，保证Tkinter/托盘/进度条正常） (Start GUI first (main thread, ensure Tkinter/tray/progress bar work correctly))
     def start_servers():
+        load_print_config()
+        threading.Thread(target=config_watcher, daemon=True).start()
         flask_thread = threading.Thread(target=run_flask, daemon=True)
         flask_thread.start()
         ws_thread = threading.Thread(target=start_ws_server, daemon=True)
         ws_thread.start()
+        threading.Thread(target=run_fleet_node, daemon=True).start()
     threading.Thread(target=start_servers, daemon=True).start()
     start_gui()
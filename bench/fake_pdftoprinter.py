@@ -0,0 +1,89 @@
+"""模拟 PDFtoPrinter.exe，可调延迟和失败率 (Fake PDFtoPrinter.exe with tunable latency and failure rate)
+
+用法与 PDFtoPrinter.exe 相同: fake_pdftoprinter.py <pdf> [printer] [/s"size"] [copies=N] [pages=1-3]
+(Same command line as PDFtoPrinter.exe.)
+
+环境变量 (Environment variables):
+    FAKE_PRINTER_LATENCY_MS  每个任务的基础耗时，默认 200 (base latency per job)
+    FAKE_PRINTER_JITTER_MS   随机附加耗时上限，默认 50 (random extra latency)
+    FAKE_PRINTER_PER_SHEET_MS 每打印一页的附加耗时，默认 10 (extra latency per printed sheet)
+    FAKE_PRINTER_FAIL_RATE   失败概率 0~1，默认 0 (failure probability)
+    FAKE_SPOOL_DIR           设置后把任务写入模拟打印队列 (when set, jobs are written to the fake spool queue)
+    FAKE_SPOOL_QUEUE_MS      任务在队列中等待的时间，默认 100 (time a job waits in the queue)
+    FAKE_SPOOL_PRINT_MS      打印耗时，默认 300 (time spent printing)
+    FAKE_SPOOL_STALL_MS      出错或缺纸持续时间，默认 1000 (how long an error or paper-out lasts)
+    FAKE_SPOOL_ERROR_RATE    打印出错（卡纸）概率，默认 0 (probability of a spooler-side error, e.g. jam)
+    FAKE_SPOOL_PAPEROUT_RATE 缺纸概率，默认 0 (probability of running out of paper)
+"""
+import json
+import os
+import random
+import sys
+import time
+
+
+def spool(pdf, printer, pages):
+    """把任务写入模拟打印队列 (Write the job into the fake spool queue)"""
+    spool_dir = os.environ['FAKE_SPOOL_DIR']
+    os.makedirs(spool_dir, exist_ok=True)
+    if not printer:
+        printer = os.environ.get('FAKE_PRINTERS', 'Label-Printer-1').split(',')[0].strip()
+    roll = random.random()
+    error_rate = float(os.environ.get('FAKE_SPOOL_ERROR_RATE', '0'))
+    paperout_rate = float(os.environ.get('FAKE_SPOOL_PAPEROUT_RATE', '0'))
+    outcome = 'error' if roll < error_rate else 'paperout' if roll < error_rate + paperout_rate else 'printed'
+    job_id = random.randint(1, 2 ** 31 - 1)
+    job = {
+        'id': job_id, 'printer': printer, 'document': os.path.basename(pdf), 'pages': pages,
+        'submitted': time.time(), 'outcome': outcome,
+        'queued_s': float(os.environ.get('FAKE_SPOOL_QUEUE_MS', '100')) / 1000.0,
+        'print_s': float(os.environ.get('FAKE_SPOOL_PRINT_MS', '300')) / 1000.0,
+        'stall_s': float(os.environ.get('FAKE_SPOOL_STALL_MS', '1000')) / 1000.0,
+    }
+    tmp = os.path.join(spool_dir, f'.{job_id}.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    os.replace(tmp, os.path.join(spool_dir, f'{job_id}.json'))
+
+
+def main(argv):
+    latency = float(os.environ.get('FAKE_PRINTER_LATENCY_MS', '200'))
+    jitter = float(os.environ.get('FAKE_PRINTER_JITTER_MS', '50'))
+    per_sheet = float(os.environ.get('FAKE_PRINTER_PER_SHEET_MS', '10'))
+    fail_rate = float(os.environ.get('FAKE_PRINTER_FAIL_RATE', '0'))
+
+    if not argv:
+        print('Usage: PDFtoPrinter <pdf> [printer] [/s"size"]', file=sys.stderr)
+        return 2
+    pdf = argv[0]
+    if not os.path.exists(pdf):
+        print(f'File not found: {pdf}', file=sys.stderr)
+        return 1
+    with open(pdf, 'rb') as f:
+        content = f.read()
+    if not content.startswith(b'%PDF-'):
+        print('Invalid PDF file', file=sys.stderr)
+        return 1
+
+    copies, sheets = 1, max(1, content.count(b'/Type /Page ') + content.count(b'/Type /Page>'))
+    for arg in argv[1:]:
+        if arg.startswith('copies='):
+            copies = int(arg[len('copies='):])
+        elif arg.startswith('pages='):
+            sheets = 0
+            for part in arg[len('pages='):].split(','):
+                first, _, last = part.partition('-')
+                sheets += int(last or first) - int(first) + 1
+
+    time.sleep((latency + random.uniform(0, jitter) + per_sheet * copies * sheets) / 1000.0)
+
+    if random.random() < fail_rate:
+        print('Printer error: paper jam', file=sys.stderr)
+        return 1
+    if os.environ.get('FAKE_SPOOL_DIR'):
+        spool(pdf, argv[1] if len(argv) > 1 else '', copies * sheets)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
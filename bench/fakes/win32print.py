@@ -0,0 +1,109 @@
+"""Linux 下用于压测的 win32print 替身 (Fake win32print for benchmarking on Linux)
+
+打印机列表由环境变量 FAKE_PRINTERS 指定（逗号分隔），第一个为默认打印机。
+(The printer list comes from FAKE_PRINTERS, comma separated; the first one is the default printer.)
+
+打印队列由 fake_pdftoprinter.py 写入 FAKE_SPOOL_DIR 的任务文件模拟，EnumJobs 按时间推算每个任务的状态。
+(The spool queue is simulated by job files that fake_pdftoprinter.py writes into FAKE_SPOOL_DIR;
+EnumJobs derives each job's status from the current time.)
+"""
+import json
+import os
+import time
+
+PRINTER_ENUM_LOCAL = 2
+PRINTER_ENUM_CONNECTIONS = 4
+
+JOB_STATUS_PAUSED = 0x1
+JOB_STATUS_ERROR = 0x2
+JOB_STATUS_DELETING = 0x4
+JOB_STATUS_SPOOLING = 0x8
+JOB_STATUS_PRINTING = 0x10
+JOB_STATUS_OFFLINE = 0x20
+JOB_STATUS_PAPEROUT = 0x40
+JOB_STATUS_PRINTED = 0x80
+JOB_STATUS_DELETED = 0x100
+JOB_STATUS_BLOCKED_DEVQ = 0x200
+JOB_STATUS_USER_INTERVENTION = 0x400
+JOB_STATUS_RESTART = 0x800
+JOB_STATUS_COMPLETE = 0x1000
+
+
+def _printers():
+    names = os.environ.get('FAKE_PRINTERS', 'Label-Printer-1,A4-Printer')
+    return [n.strip() for n in names.split(',') if n.strip()]
+
+
+def GetDefaultPrinter():
+    printers = _printers()
+    if not printers:
+        raise RuntimeError('No default printer')
+    return printers[0]
+
+
+def EnumPrinters(flags, name=None, level=1):
+    # level 1 元组: (flags, description, name, comment)
+    return [(8388608, f'{p},Fake Driver,', p, '') for p in _printers()]
+
+
+def OpenPrinter(name, defaults=None):
+    if name not in _printers():
+        raise RuntimeError(f'OpenPrinter: printer not found: {name}')
+    return name
+
+
+def ClosePrinter(handle):
+    pass
+
+
+def _job_status(job, now):
+    """按提交时间推算状态，已离开队列返回 None (Derive the status from the submit time; None once the job left the queue)"""
+    t = now - job['submitted']
+    queued, printing = job['queued_s'], job['queued_s'] + job['print_s']
+    if t < queued:
+        return 0
+    if job['outcome'] == 'paperout':
+        # 缺纸一段时间后补纸继续打印 (Out of paper for a while, then refilled and printed)
+        if t < printing:
+            return JOB_STATUS_PRINTING
+        if t < printing + job['stall_s']:
+            return JOB_STATUS_PRINTING | JOB_STATUS_PAPEROUT
+        return JOB_STATUS_PRINTING if t < printing + job['stall_s'] + job['print_s'] else None
+    if t < printing:
+        return JOB_STATUS_PRINTING
+    if job['outcome'] == 'error':
+        if t < printing + job['stall_s']:
+            return JOB_STATUS_ERROR
+        return JOB_STATUS_ERROR | JOB_STATUS_DELETING if t < printing + job['stall_s'] + 0.5 else None
+    # 与真实打印后台一样，打印完成后带着删除中标志停留片刻再离开队列 (Like the real spooler, a printed job lingers with the deleting flag before leaving)
+    return JOB_STATUS_PRINTED | JOB_STATUS_DELETING if t < printing + 0.5 else None
+
+
+def EnumJobs(handle, first_job, no_jobs, level=1):
+    spool_dir = os.environ.get('FAKE_SPOOL_DIR')
+    if not spool_dir or not os.path.isdir(spool_dir):
+        return []
+    now = time.time()
+    jobs = []
+    for fname in sorted(os.listdir(spool_dir)):
+        if not fname.endswith('.json'):
+            continue
+        path = os.path.join(spool_dir, fname)
+        try:
+            with open(path, encoding='utf-8') as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if job['printer'] != handle:
+            continue
+        status = _job_status(job, now)
+        if status is None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        printed = job['pages'] if status & JOB_STATUS_PRINTING and not status & (JOB_STATUS_PAPEROUT | JOB_STATUS_ERROR) else 0
+        jobs.append({'JobId': job['id'], 'pPrinterName': handle, 'pDocument': job['document'], 'Status': status,
+                     'TotalPages': job['pages'], 'PagesPrinted': printed})
+    return jobs[first_job:] if no_jobs < 0 else jobs[first_job:first_job + no_jobs]
@@ -0,0 +1,39 @@
+"""Linux 下用于压测的 winreg 替身，数据只保存在内存中 (Fake in-memory winreg for benchmarking on Linux)"""
+
+HKEY_CURRENT_USER = 0x80000001
+KEY_READ = 0x20019
+KEY_SET_VALUE = 0x0002
+REG_SZ = 1
+
+_store = {}
+
+
+class _Key:
+    def __init__(self, path):
+        self.path = path
+
+
+def OpenKey(root, path, reserved=0, access=KEY_READ):
+    return _Key(path)
+
+
+def CloseKey(key):
+    pass
+
+
+def QueryValueEx(key, name):
+    try:
+        return _store[(key.path, name)], REG_SZ
+    except KeyError:
+        raise FileNotFoundError(name)
+
+
+def SetValueEx(key, name, reserved, type_, value):
+    _store[(key.path, name)] = value
+
+
+def DeleteValue(key, name):
+    try:
+        del _store[(key.path, name)]
+    except KeyError:
+        raise FileNotFoundError(name)
@@ -0,0 +1,89 @@
+"""模拟面单 HTTP 服务，返回固定的 PDF (Stub label HTTP server returning a fixed PDF)
+
+GET /label.pdf          返回面单 PDF (returns the label PDF)
+GET /label.pdf?ms=300   本次请求额外延迟 300ms (adds 300ms latency to this request)
+GET /missing.pdf        返回 404 (returns 404)
+"""
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_pdf(pages=1, padding_kb=0):
+    """生成一个最小可用的多页 PDF (Build a minimal valid PDF with the given page count)"""
+    objs = ['<< /Type /Catalog /Pages 2 0 R >>']
+    kids = ' '.join(f'{3 + i} 0 R' for i in range(pages))
+    objs.append(f'<< /Type /Pages /Kids [{kids}] /Count {pages} >>')
+    for _ in range(pages):
+        # 100x150mm = 283x425pt
+        objs.append('<< /Type /Page /Parent 2 0 R /MediaBox [0 0 283 425] >>')
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for i, body in enumerate(objs, start=1):
+        offsets.append(len(out))
+        out += f'{i} 0 obj\n{body}\nendobj\n'.encode('ascii')
+    if padding_kb:
+        out += b'%' + b'0' * (padding_kb * 1024) + b'\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objs) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    for off in offsets:
+        out += f'{off:010d} 00000 n \n'.encode('ascii')
+    out += f'trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('ascii')
+    return bytes(out)
+
+
+class LabelServer:
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, pdf=None):
+        self.latency_ms = latency_ms
+        self.pdf = pdf or make_pdf()
+        self.hits = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(parsed.query)
+                with server._lock:
+                    server.hits += 1
+                if parsed.path != '/label.pdf':
+                    self.send_error(404)
+                    return
+                delay = float(query.get('ms', [server.latency_ms])[0])
+                if delay:
+                    time.sleep(delay / 1000.0)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/pdf')
+                self.send_header('Content-Length', str(len(server.pdf)))
+                self.end_headers()
+                self.wfile.write(server.pdf)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = f'http://{host}:{self.port}/label.pdf'
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Stub label HTTP server')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+    srv = LabelServer(port=args.port, latency_ms=args.latency_ms)
+    print(f'Serving {srv.url}')
+    srv.httpd.serve_forever()
@@ -0,0 +1,354 @@
+"""打印服务端到端压测 (End-to-end load test for the print service)
+
+在 Linux 上运行：启动模拟面单服务、模拟 PDFtoPrinter 和无界面打印服务，
+按指定并发压测 /print 和 WebSocket 接口，输出吞吐、延迟分位数、CPU 和内存到 JSON。
+(Runs on Linux: starts a stub label server, a fake PDFtoPrinter and the headless
+print service, drives /print and the WebSocket endpoint with the given concurrency,
+and writes throughput, latency percentiles, CPU and RSS to JSON.)
+
+    python bench/run_bench.py --concurrency 8 --requests 200 --out bench_results.json
+    python bench/run_bench.py --compare bench_results.json --out new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+import websockets
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from label_server import LabelServer, make_pdf  # noqa: E402
+
+CLK_TCK = os.sysconf('SC_CLK_TCK')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class ProcSampler:
+    """通过 /proc 采样服务进程的 CPU 时间和 RSS (Sample CPU time and RSS of the service process via /proc)
+
+    包含子进程（已回收的 PDFtoPrinter）的 CPU 时间。
+    (Includes CPU time of reaped children, i.e. the PDFtoPrinter processes.)
+    """
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.rss_peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def cpu_times(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        utime, stime, cutime, cstime = (int(x) for x in fields[11:15])
+        return (utime + stime) / CLK_TCK, (cutime + cstime) / CLK_TCK
+
+    def rss(self):
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.rss_peak = max(self.rss_peak, self.rss())
+            except OSError:
+                return
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.rss_peak = self.rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self._stop.clear()
+
+
+def print_payload(label_url, printer, profile=None, copies=None, page_range=None, collate=True):
+    data = {'pdfUrl': label_url}
+    if printer:
+        data['printerName'] = printer
+    if profile:
+        data['profile'] = profile
+    if copies:
+        data['copies'] = copies
+    if page_range:
+        data['pageRange'] = page_range
+    if not collate:
+        data['collate'] = False
+    return data
+
+
+def run_http(port, payload, total, concurrency):
+    url = f'http://127.0.0.1:{port}/print'
+    local = threading.local()
+
+    def one(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        t0 = time.perf_counter()
+        try:
+            resp = session.post(url, json=payload, timeout=120)
+            body = resp.json()
+            ok = resp.status_code == 200 and body.get('status') == 'ok'
+            err = None if ok else 'busy' if resp.status_code == 429 else f'{resp.status_code} {body.get("message", "")}'
+        except Exception as e:
+            ok, err = False, str(e)
+        return time.perf_counter() - t0, ok, err
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(total)))
+
+
+def run_ws(port, payload, total, concurrency, wait_final=False):
+    uri = f'ws://127.0.0.1:{port}'
+    # 等待最终状态时才请求推送 (Ask for pushes only when waiting for the final state)
+    message = json.dumps(dict(payload, track=True) if wait_final else payload)
+    results = []
+    counter = {'left': total}
+
+    async def client():
+        async with websockets.connect(uri, max_size=None) as ws:
+            while counter['left'] > 0:
+                counter['left'] -= 1
+                t0 = time.perf_counter()
+                try:
+                    await ws.send(message)
+                    body = json.loads(await ws.recv())
+                    while body.get('method') in ('jobstatus', 'flowcontrol'):
+                        body = json.loads(await ws.recv())
+                    ok = body.get('status') == 'ok'
+                    err = None if ok else 'busy' if body.get('status') == 'busy' else body.get('message', '')
+                    if ok and wait_final:
+                        # 等待打印队列推送最终状态 (Wait for the final spool state to be pushed)
+                        job_id = body['jobId']
+                        while True:
+                            event = json.loads(await ws.recv())
+                            if event.get('method') == 'jobstatus' and event['jobId'] == job_id and event['final']:
+                                break
+                        ok = event['state'] == 'printed'
+                        err = None if ok else f'spool {event["state"]}'
+                except Exception as e:
+                    ok, err = False, str(e)
+                results.append((time.perf_counter() - t0, ok, err))
+
+    async def main():
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    asyncio.run(main())
+    return results
+
+
+def summarize(samples, wall, cpu_before, cpu_after, rss_peak, rss_end):
+    latencies = [s[0] * 1000 for s in samples]
+    ok = sum(1 for s in samples if s[1])
+    errors = {}
+    for _, success, err in samples:
+        if not success:
+            key = (err or '')[:120]
+            errors[key] = errors.get(key, 0) + 1
+    self_cpu = cpu_after[0] - cpu_before[0]
+    child_cpu = cpu_after[1] - cpu_before[1]
+    return {
+        'requests': len(samples),
+        'ok': ok,
+        'errors': len(samples) - ok,
+        'error_kinds': errors,
+        'rejected_busy': errors.get('busy', 0),
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(samples) / wall, 2) if wall else None,
+        'ok_rps': round(ok / wall, 2) if wall else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50': round(percentile(latencies, 50), 2) if latencies else None,
+            'p95': round(percentile(latencies, 95), 2) if latencies else None,
+            'p99': round(percentile(latencies, 99), 2) if latencies else None,
+            'max': round(max(latencies), 2) if latencies else None,
+        },
+        'cpu': {
+            'service_s': round(self_cpu, 3),
+            'children_s': round(child_cpu, 3),
+            'service_pct': round(100.0 * self_cpu / wall, 1) if wall else None,
+        },
+        'rss_mb': {
+            'peak': round(rss_peak / 1048576, 1),
+            'end': round(rss_end / 1048576, 1),
+        },
+    }
+
+
+def compare(old, new):
+    """打印两次结果的对比 (Print a comparison of two result files)"""
+    print(f'\n对比 (compare): {old["meta"]["timestamp"]} -> {new["meta"]["timestamp"]}')
+    for mode, cur in new['results'].items():
+        base = old['results'].get(mode)
+        if not base:
+            continue
+        print(f'  [{mode}]')
+        rows = [('throughput_rps', base['throughput_rps'], cur['throughput_rps'])]
+        for k in ('p50', 'p95', 'p99'):
+            rows.append((f'latency_{k}_ms', base['latency_ms'][k], cur['latency_ms'][k]))
+        rows.append(('service_cpu_s', base['cpu']['service_s'], cur['cpu']['service_s']))
+        rows.append(('rss_peak_mb', base['rss_mb']['peak'], cur['rss_mb']['peak']))
+        for name, a, b in rows:
+            if a is None or b is None:
+                continue
+            delta = (b - a) / a * 100 if a else 0.0
+            print(f'    {name:<18} {a:>10} -> {b:<10} ({delta:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the print service with fake backends')
+    parser.add_argument('--mode', choices=['http', 'ws', 'both'], default='both')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=100, help='每种接口的请求总数 (total requests per endpoint)')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--printer', default=None, help='printerName，默认不传 (omitted by default)')
+    parser.add_argument('--profile', default=None, help='打印配置档名称 (print profile name)')
+    parser.add_argument('--copies', type=int, default=None)
+    parser.add_argument('--page-range', default=None, help='如 (e.g.) 1-2')
+    parser.add_argument('--no-collate', action='store_true')
+    parser.add_argument('--label-pages', type=int, default=1)
+    parser.add_argument('--printer-latency-ms', type=float, default=200)
+    parser.add_argument('--printer-jitter-ms', type=float, default=50)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--spool-print-ms', type=float, default=300)
+    parser.add_argument('--spool-error-rate', type=float, default=0.0)
+    parser.add_argument('--spool-paperout-rate', type=float, default=0.0)
+    parser.add_argument('--wait-final', action='store_true',
+                        help='WS 模式下等待打印队列最终状态再计时结束 (in WS mode, time until the final spool state)')
+    parser.add_argument('--label-latency-ms', type=float, default=20)
+    parser.add_argument('--printers', default='Label-Printer-1,A4-Printer')
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', default=None, help='与之前的 JSON 结果对比 (compare with a previous JSON result)')
+    parser.add_argument('--limits', default=None,
+                        help='服务端限流设置 JSON，如 \'{"maxInflight": 4}\' (service admission limits as JSON)')
+    parser.add_argument('--keep-workdir', action='store_true')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='printbench-')
+    label = LabelServer(latency_ms=args.label_latency_ms, pdf=make_pdf(pages=args.label_pages)).start()
+    http_port, ws_port = free_port(), free_port()
+
+    env = dict(os.environ)
+    env.update({
+        'FAKE_PRINTERS': args.printers,
+        'FAKE_PRINTER_LATENCY_MS': str(args.printer_latency_ms),
+        'FAKE_PRINTER_JITTER_MS': str(args.printer_jitter_ms),
+        'FAKE_PRINTER_FAIL_RATE': str(args.fail_rate),
+        'FAKE_SPOOL_DIR': os.path.join(workdir, 'spool'),
+        'FAKE_SPOOL_PRINT_MS': str(args.spool_print_ms),
+        'FAKE_SPOOL_ERROR_RATE': str(args.spool_error_rate),
+        'FAKE_SPOOL_PAPEROUT_RATE': str(args.spool_paperout_rate),
+        'PYSTRAY_BACKEND': 'dummy',
+        'PYTHONUNBUFFERED': '1',
+    })
+    service_log = open(os.path.join(workdir, 'service.out'), 'w')
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'serve.py'),
+         '--http-port', str(http_port), '--ws-port', str(ws_port), '--workdir', workdir]
+        + (['--limits', args.limits] if args.limits else []),
+        env=env, stdout=service_log, stderr=subprocess.STDOUT)
+
+    results = {}
+    try:
+        if not (wait_port(http_port) and wait_port(ws_port)):
+            raise SystemExit(f'打印服务启动失败，请查看 {service_log.name} (service failed to start)')
+        payload = print_payload(label.url, args.printer, args.profile, args.copies, args.page_range, not args.no_collate)
+        sampler = ProcSampler(proc.pid)
+        modes = ['http', 'ws'] if args.mode == 'both' else [args.mode]
+        runners = {'http': (run_http, http_port, {}), 'ws': (run_ws, ws_port, {'wait_final': args.wait_final})}
+        for mode in modes:
+            runner, port, extra = runners[mode]
+            if args.warmup:
+                runner(port, payload, args.warmup, 1, **extra)
+            cpu_before = sampler.cpu_times()
+            sampler.start()
+            t0 = time.perf_counter()
+            samples = runner(port, payload, args.requests, args.concurrency, **extra)
+            wall = time.perf_counter() - t0
+            sampler.stop()
+            cpu_after = sampler.cpu_times()
+            results[mode] = summarize(samples, wall, cpu_before, cpu_after, sampler.rss_peak, sampler.rss())
+            r = results[mode]
+            print(f'[{mode}] {r["requests"]} req, {r["errors"]} err ({r["rejected_busy"]} busy), {r["throughput_rps"]} req/s, '
+                  f'p50 {r["latency_ms"]["p50"]}ms p95 {r["latency_ms"]["p95"]}ms p99 {r["latency_ms"]["p99"]}ms, '
+                  f'cpu {r["cpu"]["service_s"]}s, rss peak {r["rss_mb"]["peak"]}MB')
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        service_log.close()
+        label.stop()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'label_hits': label.hits,
+            'workdir': workdir if args.keep_workdir else None,
+            'config': vars(args),
+        },
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 (results written to) {args.out}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+    if not args.keep_workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
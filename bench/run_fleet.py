@@ -0,0 +1,151 @@
+"""集群模式压测：本机启动一个调度服务和多个打印节点 (Fleet load test: one dispatcher and several print nodes on localhost)
+
+每个节点有自己的面单打印机 StationN-Label，所有节点共享 Shared-A4，用于验证按打印机路由和故障切换。
+(Each node owns StationN-Label and all nodes share Shared-A4, to exercise routing and failover.)
+
+    python bench/run_fleet.py --nodes 3 --requests 300 --concurrency 12 --kill-node-after 100
+"""
+import argparse
+import itertools
+import json
+import os
+import secrets
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+from label_server import LabelServer  # noqa: E402
+from run_bench import ProcSampler, free_port, summarize, wait_port  # noqa: E402
+
+SHARED_PRINTER = 'Shared-A4'
+
+
+def wait_nodes(http_port, count, auth, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            nodes = requests.get(f'http://127.0.0.1:{http_port}/nodes', headers=auth, timeout=2).json()['nodes']
+            if len(nodes) >= count:
+                return nodes
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the fleet dispatcher with several local nodes')
+    parser.add_argument('--nodes', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=150)
+    parser.add_argument('--printer-latency-ms', type=float, default=200)
+    parser.add_argument('--kill-node-after', type=int, default=0,
+                        help='完成多少个请求后强制结束第一个节点，0 表示不结束 (SIGKILL node 0 after this many requests, 0 = never)')
+    parser.add_argument('--out', default='fleet_results.json')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='printfleet-')
+    token = secrets.token_hex(16)
+    auth = {'Authorization': f'Bearer {token}'}
+    label = LabelServer(latency_ms=10).start()
+    ws_port, http_port = free_port(), free_port()
+    procs = []
+    logs = []
+
+    def spawn(cmd, env, name):
+        out = open(os.path.join(workdir, f'{name}.out'), 'w')
+        logs.append(out)
+        proc = subprocess.Popen(cmd, env=env, stdout=out, stderr=subprocess.STDOUT)
+        procs.append(proc)
+        return proc
+
+    base_env = dict(os.environ, PYSTRAY_BACKEND='dummy', PYTHONUNBUFFERED='1',
+                    FAKE_PRINTER_LATENCY_MS=str(args.printer_latency_ms))
+    dispatcher = spawn([sys.executable, os.path.join(REPO_DIR, 'dispatcher.py'), '--host', '127.0.0.1',
+                        '--ws-port', str(ws_port), '--http-port', str(http_port), '--token', token], base_env, 'dispatcher')
+    nodes = []
+    for i in range(args.nodes):
+        env = dict(base_env, FAKE_PRINTERS=f'Station{i}-Label,{SHARED_PRINTER}')
+        nodes.append(spawn([sys.executable, os.path.join(BENCH_DIR, 'serve.py'),
+                            '--http-port', str(free_port()), '--ws-port', str(free_port()),
+                            '--workdir', os.path.join(workdir, f'node{i}'),
+                            '--dispatcher', f'ws://127.0.0.1:{ws_port}/node', '--node', f'station{i}',
+                            '--fleet-token', token], env, f'node{i}'))
+
+    samples, per_node, printers = [], {}, []
+    lock = threading.Lock()
+    done = {'n': 0}
+    try:
+        if not wait_port(http_port) or not wait_nodes(http_port, args.nodes, auth):
+            raise SystemExit(f'调度服务或节点启动失败，请查看 {workdir} (dispatcher or nodes failed to start)')
+        printers = [f'Station{i}-Label' for i in range(args.nodes)] + [SHARED_PRINTER]
+        targets = itertools.cycle(printers)
+        url = f'http://127.0.0.1:{http_port}/print'
+
+        def one(printer):
+            t0 = time.perf_counter()
+            try:
+                body = requests.post(url, json={'pdfUrl': label.url, 'printerName': printer}, headers=auth, timeout=120).json()
+                ok = body.get('status') == 'ok'
+                err = None if ok else f'{printer}: {body.get("message", "")}'
+            except Exception as e:
+                ok, err, body = False, str(e), {}
+            with lock:
+                per_node[body.get('node') or '-'] = per_node.get(body.get('node') or '-', 0) + 1
+                done['n'] += 1
+                if args.kill_node_after and done['n'] == args.kill_node_after:
+                    nodes[0].send_signal(signal.SIGKILL)
+            return time.perf_counter() - t0, ok, err
+
+        sampler = ProcSampler(dispatcher.pid)
+        cpu_before = sampler.cpu_times()
+        sampler.start()
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            samples = list(pool.map(one, [next(targets) for _ in range(args.requests)]))
+        wall = time.perf_counter() - t0
+        sampler.stop()
+        result = summarize(samples, wall, cpu_before, sampler.cpu_times(), sampler.rss_peak, sampler.rss())
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        for out in logs:
+            out.close()
+        label.stop()
+
+    result['per_node'] = per_node
+    print(f'[fleet] {result["requests"]} req, {result["errors"]} err, {result["throughput_rps"]} req/s, '
+          f'p50 {result["latency_ms"]["p50"]}ms p99 {result["latency_ms"]["p99"]}ms, per node {per_node}')
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'config': vars(args),
+            'printers': printers,
+        },
+        'results': {'fleet': result},
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'结果已写入 (results written to) {args.out}')
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
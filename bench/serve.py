@@ -0,0 +1,78 @@
+"""无界面启动打印服务（HTTP + WebSocket），使用 fakes 目录中的替身模块 (Run the print service headless with the fake Windows modules)
+
+由 run_bench.py 以子进程方式启动，也可单独运行用于调试:
+(Started as a subprocess by run_bench.py; can also be run by hand for debugging:)
+
+    python bench/serve.py --http-port 12345 --ws-port 12346 --workdir /tmp/printbench
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+FAKE_PRINTER_SCRIPT = os.path.join(BENCH_DIR, 'fake_pdftoprinter.py')
+
+
+def make_fake_pdftoprinter(workdir):
+    """生成可执行的 PDFtoPrinter 包装脚本 (Write an executable PDFtoPrinter wrapper script)"""
+    path = os.path.join(workdir, 'PDFtoPrinter.exe')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_PRINTER_SCRIPT}" "$@"\n')
+    os.chmod(path, 0o755)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless print service for benchmarking')
+    parser.add_argument('--http-port', type=int, default=12345)
+    parser.add_argument('--ws-port', type=int, default=12346)
+    parser.add_argument('--workdir', required=True)
+    parser.add_argument('--config', default=None, help='打印配置文件，默认在 workdir 中生成 (print config file, generated in workdir by default)')
+    parser.add_argument('--dispatcher', default=None, help='集群调度服务地址，如 ws://127.0.0.1:12350/node (fleet dispatcher URL)')
+    parser.add_argument('--node', default=None, help='集群节点名 (fleet node name)')
+    parser.add_argument('--fleet-token', default=None, help='集群共享令牌 (fleet shared token)')
+    parser.add_argument('--limits', default=None, help='限流设置 JSON，如 {"maxInflight": 4} (admission limits as JSON)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(BENCH_DIR, 'fakes'))
+    sys.path.insert(0, REPO_DIR)
+    os.environ.setdefault('PYSTRAY_BACKEND', 'dummy')
+    import app
+
+    os.makedirs(args.workdir, exist_ok=True)
+    os.environ.setdefault('FAKE_SPOOL_DIR', os.path.join(args.workdir, 'spool'))
+    app.BASE_DIR = args.workdir
+    app.LOG_FILE = os.path.join(args.workdir, 'print.log')
+    app.CACHE_DIR = os.path.join(args.workdir, 'pdf_cache')
+    os.makedirs(app.CACHE_DIR, exist_ok=True)
+    app.PDFTOPRINTER_PATH = make_fake_pdftoprinter(args.workdir)
+    app.CONFIG_FILE = args.config or os.path.join(args.workdir, 'print_config.json')
+    if (args.dispatcher or args.limits) and not args.config:
+        config = dict(app.DEFAULT_CONFIG)
+        if args.dispatcher:
+            config['fleet'] = {'dispatcher': args.dispatcher, 'node': args.node or '', 'token': args.fleet_token or ''}
+        if args.limits:
+            config['limits'] = json.loads(args.limits)
+        with open(app.CONFIG_FILE, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+    app.load_print_config()
+    threading.Thread(target=app.config_watcher, daemon=True).start()
+    app.PORT = args.http_port
+    app.WS_PORT = args.ws_port
+
+    threading.Thread(target=app.run_flask, daemon=True).start()
+    threading.Thread(target=app.start_ws_server, daemon=True).start()
+    threading.Thread(target=app.run_fleet_node, daemon=True).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
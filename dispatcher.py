@@ -0,0 +1,353 @@
+# 多工位集群调度服务：打印节点主动连接本服务并上报打印机和负载，任务按打印机路由到对应节点
+# (Fleet dispatcher: print nodes connect in and report printers and load; jobs are routed to the node that owns the printer)
+import os
+import sys
+import hmac
+import json
+import uuid
+import asyncio
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+
+import websockets
+import websockets.exceptions
+from websockets.protocol import State
+from flask import Flask, request, jsonify
+
+"""
+全局变量声明 (Global state, only touched from the asyncio loop unless noted)
+"""
+NODES = {}          # 节点名 -> 节点信息 (node name -> node info)
+JOB_CLIENTS = {}    # jobId -> 推送回调，把打印队列状态转发给提交任务的客户端 (jobId -> push callback to the submitting client)
+JOB_SUBSCRIBERS = []
+LOOP = None
+TOKEN = ''          # 共享令牌，节点注册和客户端提交都必须携带 (Shared token required for node registration and client submissions)
+
+HOST = '0.0.0.0'
+WS_PORT = 12350     # 节点和客户端 WebSocket 端口，节点连接 /node (WebSocket port for nodes (/node) and clients)
+PORT = 12351        # HTTP 端口 (HTTP port)
+HEARTBEAT_INTERVAL = 5   # 需与节点一致 (must match the nodes)
+NODE_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+JOB_TIMEOUT = 90
+
+app = Flask(__name__)
+
+
+def log(msg):
+    print(f"{datetime.now()} {msg}", flush=True)
+
+
+def authorized(token):
+    return bool(token) and hmac.compare_digest(str(token).encode(), TOKEN.encode())
+
+
+def request_token(headers, query):
+    """从 Authorization: Bearer 头或 ?token= 参数取令牌；浏览器 WebSocket 不能设置请求头，只能用参数
+    (Take the token from an Authorization: Bearer header or ?token=; browser WebSockets cannot set headers)
+    """
+    auth = headers.get('Authorization') or ''
+    if auth.startswith('Bearer '):
+        return auth[len('Bearer '):].strip()
+    return query.get('token') or ''
+
+
+class NodeLost(Exception):
+    """节点在返回结果前断开 (Node went away before returning a result)"""
+    def __init__(self, accepted):
+        super().__init__('节点已断开')
+        self.accepted = accepted
+
+
+def node_load(node):
+    return node['load'] + len(node['inflight'])
+
+
+def pick_node(printer_name, node_name, tried):
+    """选择拥有该打印机、健康且负载最低的节点 (Pick the healthy, least-loaded node that owns the printer)"""
+    candidates = [n for n in NODES.values()
+                  if n['healthy'] and n['name'] not in tried
+                  and (not node_name or n['name'] == node_name)
+                  and (not printer_name or printer_name in n['printers'])]
+    return min(candidates, key=node_load) if candidates else None
+
+
+async def dispatch(data, push=None, client=''):
+    """把打印任务转发到节点，节点未接收任务就断开时自动切换到其他节点 (Forward a job to a node; fail over if the node drops before accepting it)
+
+    client 为提交任务的客户端标识，节点据此按来源限流 (client identifies the submitter so the node can rate-limit per origin)
+    """
+    printer_name = (data.get('printerName') or '').strip()
+    node_name = data.get('node')
+    tried = set()
+    while True:
+        node = pick_node(printer_name, node_name, tried)
+        if node is None:
+            if tried:
+                return {'status': 'error', 'message': f'所有可用节点均已断开：{", ".join(sorted(tried))}。建议：检查工位网络。'}
+            target = printer_name or node_name or '任意打印机'
+            return {'status': 'error', 'message': f'没有在线节点可以打印到：{target}。建议：检查工位是否在线、打印机名称是否正确。'}
+        tried.add(node['name'])
+        req_id = uuid.uuid4().hex
+        entry = {'future': LOOP.create_future(), 'accepted': False, 'push': push}
+        node['inflight'][req_id] = entry
+        try:
+            await node['ws'].send(json.dumps({'type': 'job', 'reqId': req_id, 'data': data, 'client': client}, ensure_ascii=False))
+            resp = await asyncio.wait_for(entry['future'], JOB_TIMEOUT)
+        except websockets.exceptions.ConnectionClosed:
+            log(f'节点 {node["name"]} 连接已断开，切换节点')
+            continue
+        except NodeLost as e:
+            if not e.accepted:
+                log(f'节点 {node["name"]} 断开，任务未开始，切换节点')
+                continue
+            # 任务已开始，重发可能重复打印 (Already started; resending could print twice)
+            return {'status': 'error', 'node': node['name'],
+                    'message': f'节点 {node["name"]} 在打印过程中断开，打印结果未知，请到该工位核实后再重打。'}
+        except asyncio.TimeoutError:
+            return {'status': 'error', 'node': node['name'], 'message': f'节点 {node["name"]} 打印超时。'}
+        finally:
+            node['inflight'].pop(req_id, None)
+        resp['node'] = node['name']
+        return resp
+
+
+def forward_job_event(event):
+    callback = JOB_CLIENTS.get(event.get('jobId'))
+    if event.get('final'):
+        JOB_CLIENTS.pop(event.get('jobId'), None)
+        node = NODES.get(event.get('node'))
+        if node:
+            node['jobs'].discard(event.get('jobId'))
+    for cb in ([callback] if callback and callback not in JOB_SUBSCRIBERS else []) + list(JOB_SUBSCRIBERS):
+        try:
+            cb(event)
+        except Exception:
+            pass
+
+
+async def node_handler(websocket):
+    """节点长连接：注册、心跳、任务结果和打印队列状态共用一条连接 (One persistent connection per node, multiplexing registration, heartbeats, results and spool events)"""
+    node = None
+    try:
+        hello = json.loads(await asyncio.wait_for(websocket.recv(), NODE_TIMEOUT))
+        if hello.get('type') != 'register' or not hello.get('node'):
+            await websocket.close(1008, 'register first')
+            return
+        if not authorized(hello.get('token')):
+            log(f'拒绝节点注册：令牌错误，节点名 {hello["node"]}，来源 {websocket.remote_address[0]}')
+            await websocket.close(1008, 'unauthorized')
+            return
+        name = hello['node']
+        old = NODES.get(name)
+        if old:
+            await old['ws'].close(1012, 'replaced')
+        node = {
+            'name': name, 'ws': websocket, 'printers': list(hello.get('printers') or []),
+            'load': int(hello.get('load') or 0), 'lastSeen': LOOP.time(), 'healthy': True,
+            'connectedAt': datetime.now().isoformat(timespec='seconds'), 'inflight': {},
+            'jobs': set(),  # 已登记推送目标、尚未结束的 jobId (jobIds with a registered push target that are not final yet)
+        }
+        NODES[name] = node
+        await websocket.send(json.dumps({'type': 'registered'}))
+        log(f'节点上线：{name} 打印机：{node["printers"]}')
+        async for message in websocket:
+            msg = json.loads(message)
+            node['lastSeen'] = LOOP.time()
+            kind = msg.get('type')
+            if kind == 'heartbeat':
+                node['printers'] = list(msg.get('printers') or node['printers'])
+                node['load'] = int(msg.get('load') or 0)
+                node['healthy'] = True
+            elif kind == 'accepted':
+                entry = node['inflight'].get(msg.get('reqId'))
+                if entry:
+                    entry['accepted'] = True
+            elif kind == 'result':
+                entry = node['inflight'].get(msg.get('reqId'))
+                resp = msg.get('resp') or {}
+                if entry and not entry['future'].done():
+                    # 先登记推送目标，避免紧随其后的状态事件丢失 (Register the push target first so the status events right behind it are not lost)
+                    if entry['push'] and resp.get('jobId'):
+                        JOB_CLIENTS[resp['jobId']] = entry['push']
+                        node['jobs'].add(resp['jobId'])
+                    entry['future'].set_result(resp)
+            elif kind == 'jobstatus':
+                forward_job_event(dict(msg.get('event') or {}, node=name))
+    except (asyncio.TimeoutError, ValueError, websockets.exceptions.ConnectionClosed):
+        pass
+    finally:
+        if node and NODES.get(node['name']) is node:
+            del NODES[node['name']]
+            log(f'节点下线：{node["name"]}')
+        if node:
+            # 节点离开后不会再有这些任务的最终状态，释放推送目标 (No final events will come for these jobs; release their push targets)
+            for job_id in node['jobs']:
+                JOB_CLIENTS.pop(job_id, None)
+            for entry in node['inflight'].values():
+                if not entry['future'].done():
+                    entry['future'].set_exception(NodeLost(entry['accepted']))
+
+
+async def health_checker():
+    """心跳超时的节点标记为不健康并断开 (Mark nodes with missed heartbeats unhealthy and drop them)"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        now = LOOP.time()
+        for node in list(NODES.values()):
+            if now - node['lastSeen'] > NODE_TIMEOUT and node['healthy']:
+                node['healthy'] = False
+                log(f'节点心跳超时：{node["name"]}')
+                await node['ws'].close(1011, 'heartbeat timeout')
+
+
+def fleet_printers():
+    return [{'name': p, 'node': n['name']} for n in NODES.values() if n['healthy'] for p in n['printers']]
+
+
+def node_summary():
+    return [{'name': n['name'], 'printers': n['printers'], 'load': node_load(n), 'healthy': n['healthy'],
+             'connectedAt': n['connectedAt']} for n in NODES.values()]
+
+
+async def client_handler(websocket):
+    """前端/WMS 客户端接口，消息格式与单机 WebSocket 接口一致 (Client API, same message format as the single-station WebSocket API)"""
+    client = websocket.request.headers.get('Origin') or websocket.remote_address[0]
+
+    def push(event):
+        if websocket.state is State.OPEN:
+            asyncio.ensure_future(websocket.send(json.dumps(dict(event, method='jobstatus'), ensure_ascii=False)))
+
+    async def handle(data):
+        # 只有带 track: true 的任务才推送状态，与单机接口一致 (Push status only for jobs sent with track: true, as on a single station)
+        resp = await dispatch(data, push if data.get('track') is True else None, client)
+        if 'requestId' in data:
+            resp['requestId'] = data['requestId']
+        await websocket.send(json.dumps(resp, ensure_ascii=False))
+
+    tasks = set()
+    try:
+        async for message in websocket:
+            try:
+                data = json.loads(message)
+            except ValueError:
+                await websocket.send(json.dumps({'status': 'error', 'message': '数据格式错误'}, ensure_ascii=False))
+                continue
+            method = data.get('method')
+            if method == 'getprinterlist':
+                printers = fleet_printers()
+                await websocket.send(json.dumps({'method': 'getprinterlist', 'status': 'ok', 'data': printers,
+                                                 'printers': [p['name'] for p in printers]}, ensure_ascii=False))
+            elif method == 'getnodes':
+                await websocket.send(json.dumps({'method': 'getnodes', 'status': 'ok', 'nodes': node_summary()}, ensure_ascii=False))
+            elif method == 'subscribejobs':
+                JOB_SUBSCRIBERS.append(push)
+                await websocket.send(json.dumps({'method': 'subscribejobs', 'status': 'ok'}))
+            else:
+                # 多个任务并发转发，结果按完成顺序返回 (Jobs are forwarded concurrently; results come back as they finish)
+                task = asyncio.ensure_future(handle(data))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        if push in JOB_SUBSCRIBERS:
+            JOB_SUBSCRIBERS.remove(push)
+        for job_id in [k for k, cb in JOB_CLIENTS.items() if cb is push]:
+            del JOB_CLIENTS[job_id]
+
+
+async def ws_router(websocket):
+    url = urlsplit(websocket.request.path)
+    if url.path.rstrip('/') == '/node':
+        # 节点在注册消息中携带令牌 (Nodes send the token in their register message)
+        await node_handler(websocket)
+        return
+    query = {k: v[0] for k, v in parse_qs(url.query).items()}
+    if not authorized(request_token(websocket.request.headers, query)):
+        log(f'拒绝客户端连接：令牌错误，来源 {websocket.remote_address[0]}')
+        await websocket.close(1008, 'unauthorized')
+        return
+    await client_handler(websocket)
+
+
+def run_on_loop(coro, timeout=JOB_TIMEOUT + 5):
+    """Flask 线程中调用：在调度事件循环上执行并等待结果 (Called from Flask threads: run on the dispatcher loop and wait)"""
+    return asyncio.run_coroutine_threadsafe(coro, LOOP).result(timeout)
+
+
+async def _snapshot(fn):
+    return fn()
+
+
+@app.before_request
+def check_token():
+    if not authorized(request_token(request.headers, request.args)):
+        return jsonify({'status': 'error', 'message': '未授权：缺少或错误的令牌。建议：请求头加 Authorization: Bearer <令牌>。'}), 401
+
+
+@app.route('/print', methods=['POST'])
+def print_pdf():
+    try:
+        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({'status': 'error', 'message': '参数类型错误，请检查接口调用方式。'}), 400
+        resp = run_on_loop(dispatch(data, client=request.headers.get('Origin') or request.remote_addr))
+        if resp.get('status') == 'busy':
+            return jsonify(resp), 429, {'Retry-After': str(resp.get('retryAfter') or 1)}
+        return jsonify(resp)
+    except Exception as e:
+        log(f'未知错误：{e}')
+        return jsonify({'status': 'error', 'message': f'未知错误：{e}'})
+
+
+@app.route('/nodes', methods=['GET'])
+def list_nodes():
+    return jsonify({'status': 'ok', 'nodes': run_on_loop(_snapshot(node_summary))})
+
+
+@app.route('/printers', methods=['GET'])
+def list_printers():
+    return jsonify({'status': 'ok', 'printers': run_on_loop(_snapshot(fleet_printers))})
+
+
+def run_flask():
+    try:
+        app.run(host=HOST, port=PORT, threaded=True)
+    except OSError as e:
+        log(f'HTTP服务启动失败：{e}。端口被占用，请更换端口或关闭占用程序。')
+
+
+async def ws_main():
+    global LOOP
+    LOOP = asyncio.get_running_loop()
+    async with websockets.serve(ws_router, HOST, WS_PORT, max_size=None):
+        log(f'调度服务已启动：WebSocket {HOST}:{WS_PORT}（节点连接 /node），HTTP {HOST}:{PORT}')
+        threading.Thread(target=run_flask, daemon=True).start()
+        await health_checker()
+
+
+def main():
+    global HOST, WS_PORT, PORT, TOKEN
+    parser = argparse.ArgumentParser(description='打印集群调度服务 (Print fleet dispatcher)')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--ws-port', type=int, default=WS_PORT)
+    parser.add_argument('--http-port', type=int, default=PORT)
+    parser.add_argument('--token', default=os.environ.get('PRINT_FLEET_TOKEN'),
+                        help='共享令牌，需与各工位 fleet.token 一致，也可用环境变量 PRINT_FLEET_TOKEN (shared token, must match fleet.token on the stations)')
+    args = parser.parse_args()
+    if not args.token:
+        parser.error('必须设置 --token 或环境变量 PRINT_FLEET_TOKEN，否则局域网内任何人都能向工位提交任务')
+    HOST, WS_PORT, PORT, TOKEN = args.host, args.ws_port, args.http_port, args.token
+    try:
+        asyncio.run(ws_main())
+    except OSError as e:
+        log(f'调度服务启动失败：{e}。端口被占用，请更换端口或关闭占用程序。')
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""测试用的无界面环境：用 bench/fakes 代替 win32print / winreg (Headless test setup: bench/fakes stand in for win32print / winreg)"""
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'bench', 'fakes'))
+sys.path.insert(0, REPO_DIR)
+os.environ.setdefault('PYSTRAY_BACKEND', 'dummy')
+
+import app  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_app(tmp_path, monkeypatch):
+    """日志、缓存和配置都写到临时目录 (Logs, cache and config go to a temp dir)"""
+    monkeypatch.setattr(app, 'LOG_FILE', str(tmp_path / 'print.log'))
+    monkeypatch.setattr(app, 'CACHE_DIR', str(tmp_path / 'pdf_cache'))
+    monkeypatch.setattr(app, 'CONFIG_FILE', str(tmp_path / 'print_config.json'))
+    monkeypatch.setattr(app, 'PRINT_CONFIG', app.compile_config(app.DEFAULT_CONFIG))
+    return app
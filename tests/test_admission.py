@@ -0,0 +1,178 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import pytest
+import websockets
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def admission_state(monkeypatch):
+    monkeypatch.setattr(app, '_inflight', {'total': 0, 'printers': {}})
+    monkeypatch.setattr(app, '_rate_buckets', {})
+    monkeypatch.setattr(app, '_job_seconds', {'avg': 2.0})
+    monkeypatch.setattr(app, '_rejected', {'count': 0, 'logged': 0.0})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可控时钟，替换 app 中的 datetime.now() (Controllable clock behind app's datetime.now())"""
+    now = [1_000_000.0]
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(now[0])
+
+    monkeypatch.setattr(app, 'datetime', FakeDatetime)
+    return now
+
+
+def set_limits(monkeypatch, **limits):
+    config = app.compile_config(dict(app.DEFAULT_CONFIG, limits=limits))
+    monkeypatch.setattr(app, 'PRINT_CONFIG', config)
+
+
+def test_global_inflight_limit(monkeypatch, clock):
+    set_limits(monkeypatch, maxInflight=2, maxPerPrinter=5, ratePerSecond=0)
+    assert app.admit_job('A', None) is None
+    assert app.admit_job('B', None) is None
+    busy = app.admit_job('C', None)
+    assert busy['status'] == 'busy' and busy['retryAfter'] == 2
+    app.release_job('A', clock[0])
+    assert app.admit_job('C', None) is None
+
+
+def test_per_printer_limit(monkeypatch, clock):
+    set_limits(monkeypatch, maxInflight=10, maxPerPrinter=2, ratePerSecond=0)
+    assert app.admit_job('A', None) is None
+    assert app.admit_job('A', None) is None
+    assert app.admit_job('A', None)['status'] == 'busy'
+    assert app.admit_job('B', None) is None
+    app.release_job('A', clock[0])
+    assert app.admit_job('A', None) is None
+    assert app._inflight == {'total': 3, 'printers': {'A': 2, 'B': 1}}
+
+
+def test_release_drops_empty_printer_and_updates_job_time(monkeypatch, clock):
+    assert app.admit_job('A', None) is None
+    started = clock[0]
+    clock[0] += 7
+    app.release_job('A', started)
+    assert app._inflight == {'total': 0, 'printers': {}}
+    assert app._job_seconds['avg'] == pytest.approx(0.8 * 2.0 + 0.2 * 7)
+
+
+def test_token_bucket_per_origin_refills(monkeypatch, clock):
+    set_limits(monkeypatch, maxInflight=100, maxPerPrinter=100, ratePerSecond=2, burst=3)
+    for _ in range(3):
+        assert app.admit_job('A', 'http://wms') is None
+    busy = app.admit_job('A', 'http://wms')
+    assert busy['status'] == 'busy' and busy['retryAfter'] == 1
+    # 其他来源不受影响 (Other origins are unaffected)
+    assert app.admit_job('A', 'http://other') is None
+    clock[0] += 0.5
+    assert app.admit_job('A', 'http://wms') is None
+    assert app.admit_job('A', 'http://wms')['status'] == 'busy'
+    # 未传来源时不做来源限流 (No origin means no per-origin limit)
+    assert app.admit_job('A', None) is None
+
+
+def test_omitted_and_explicit_default_printer_share_a_slot(monkeypatch):
+    set_limits(monkeypatch, maxInflight=10, maxPerPrinter=1, ratePerSecond=0)
+    profile = app.get_profile()
+    default = app.win32print.GetDefaultPrinter()
+    assert app.admission_key(None, profile) == default
+    assert app.admission_key('', profile) == default
+    assert app.admission_key('/s=A4', profile) == default
+    assert app.admit_job(app.admission_key(None, profile), None) is None
+    assert app.admit_job(app.admission_key(default, profile), None)['status'] == 'busy'
+
+
+def test_http_429_with_retry_after(monkeypatch):
+    set_limits(monkeypatch, maxInflight=1, ratePerSecond=0)
+    app._inflight['total'] = 1
+    resp = app.app.test_client().post('/print', json={'pdfUrl': 'http://127.0.0.1:9/label.pdf'})
+    assert resp.status_code == 429
+    assert resp.headers['Retry-After'] == '2'
+    assert resp.get_json()['status'] == 'busy' and resp.get_json()['retryAfter'] == 2
+
+
+def test_ws_flow_control(monkeypatch):
+    set_limits(monkeypatch, wsWindow=1)
+
+    def slow_job(data, source='', origin=None):
+        time.sleep(0.1)
+        return {'status': 'ok', 'message': ''}, 200
+
+    monkeypatch.setattr(app, 'process_print_job', slow_job)
+
+    async def session(port, notify):
+        async with websockets.connect(f'ws://127.0.0.1:{port}') as ws:
+            if notify:
+                await ws.send(json.dumps({'method': 'flowcontrol', 'notify': True}))
+                assert json.loads(await ws.recv())['notify'] is True
+            for i in range(3):
+                await ws.send(json.dumps({'pdfUrl': 'http://x/label.pdf', 'requestId': i}))
+            messages = []
+            while sum('requestId' in m for m in messages) < 3:
+                messages.append(json.loads(await asyncio.wait_for(ws.recv(), 5)))
+            return messages
+
+    async def scenario():
+        async with websockets.serve(app.ws_handler, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            return await session(port, False), await session(port, True)
+
+    legacy, notified = asyncio.run(scenario())
+    # 旧前端只收到打印结果，依次返回 (Legacy clients only get print results, in order)
+    assert [m['requestId'] for m in legacy] == [0, 1, 2]
+    flow = [m for m in notified if m.get('method') == 'flowcontrol']
+    assert [m['state'] for m in flow] == ['paused', 'resumed', 'paused', 'resumed']
+    assert not any('status' in m for m in flow)
+    assert [m['requestId'] for m in notified if 'requestId' in m] == [0, 1, 2]
+
+
+def test_spooled_jobs_count_against_the_printer(monkeypatch):
+    set_limits(monkeypatch, maxInflight=10, maxPerPrinter=2, ratePerSecond=0)
+    monkeypatch.setattr(app, 'TRACKED_JOBS', {
+        'a': {'printer': 'A', 'final': False}, 'b': {'printer': 'A', 'final': True}, 'c': {'printer': 'B', 'final': False}})
+    assert app.admit_job('A', None) is None
+    busy = app.admit_job('A', None)
+    assert busy['status'] == 'busy'
+    assert app.admit_job('B', None) is None
+    app.TRACKED_JOBS['a']['final'] = True
+    assert app.admit_job('A', None) is None
+
+
+def test_ws_pushes_job_status_only_when_tracked(monkeypatch):
+    monkeypatch.setattr(app, 'SPOOLER_BACKEND', lambda printer: [
+        {'id': 1, 'document': 'C:\\cache\\tracked.pdf', 'status': app.win32print.JOB_STATUS_PRINTED,
+         'pagesPrinted': 1, 'totalPages': 1}])
+
+    def submit(data, source='', origin=None):
+        return {'status': 'ok', 'message': '', 'jobId': app.track_spool_job('P', '/cache/tracked.pdf')}, 200
+
+    monkeypatch.setattr(app, 'process_print_job', submit)
+
+    async def session(port, extra):
+        async with websockets.connect(f'ws://127.0.0.1:{port}') as ws:
+            await ws.send(json.dumps(dict({'pdfUrl': 'http://x/label.pdf'}, **extra)))
+            messages = [json.loads(await asyncio.wait_for(ws.recv(), 5))]
+            await asyncio.sleep(0.8)
+            await ws.send(json.dumps({'method': 'getprofiles'}))
+            while messages[-1].get('method') != 'getprofiles':
+                messages.append(json.loads(await asyncio.wait_for(ws.recv(), 5)))
+            return [m.get('method') for m in messages]
+
+    async def scenario():
+        async with websockets.serve(app.ws_handler, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            return await session(port, {}), await session(port, {'track': True})
+
+    legacy, tracked = asyncio.run(scenario())
+    assert legacy == [None, 'getprofiles']
+    assert tracked == [None, 'jobstatus', 'getprofiles']
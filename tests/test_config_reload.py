@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import threading
+import time
+
+import app
+
+
+def write_config(path, paper_size, mtime):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'defaultProfile': 'label', 'profiles': {'label': {'paperSize': paper_size}}}, f)
+    os.utime(path, (mtime, mtime))
+
+
+def test_load_swaps_config_and_keeps_old_one_when_invalid():
+    write_config(app.CONFIG_FILE, '4x6', 1000)
+    assert app.load_print_config()
+    assert app.get_profile()['paperSize'] == '4x6'
+    before = app.PRINT_CONFIG
+
+    with open(app.CONFIG_FILE, 'w', encoding='utf-8') as f:
+        f.write('{"profiles": {"label": {"copies": 0}}}')
+    assert not app.load_print_config()
+    assert app.PRINT_CONFIG is before
+
+    with open(app.CONFIG_FILE, 'w', encoding='utf-8') as f:
+        f.write('{not json')
+    assert not app.load_print_config()
+    assert app.PRINT_CONFIG is before
+
+
+def test_watcher_reloads_changed_file():
+    write_config(app.CONFIG_FILE, '4x6', 1000)
+    app.load_print_config()
+    stop = threading.Event()
+    watcher = threading.Thread(target=app.config_watcher, args=(0.05, stop), daemon=True)
+    watcher.start()
+    try:
+        write_config(app.CONFIG_FILE, 'A5', 2000)
+        deadline = time.time() + 5
+        while app.get_profile()['paperSize'] != 'A5' and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        watcher.join()
+    assert app.get_profile()['paperSize'] == 'A5'
+
+
+def test_reload_during_a_job_leaves_it_on_its_profile(tmp_path, monkeypatch):
+    write_config(app.CONFIG_FILE, '4x6', 1000)
+    app.load_print_config()
+    os.makedirs(app.CACHE_DIR)
+    pdf = tmp_path / 'label.pdf'
+    pdf.write_bytes(b'%PDF-1.4\n<< /Type /Page >>\n')
+    exe = tmp_path / 'PDFtoPrinter.exe'
+    exe.write_bytes(b'')
+    monkeypatch.setattr(app, 'PDFTOPRINTER_PATH', str(exe))
+    monkeypatch.setattr(app, 'track_spool_job', lambda printer, path: 'job-1')
+    resolve = app.resolve_printer
+
+    def resolve_then_reload(printer_name, profile, source=''):
+        # 任务已取定配置档后，配置文件被修改并重新加载 (The config changes after the job has taken its profile)
+        write_config(app.CONFIG_FILE, 'A5', 2000)
+        assert app.load_print_config()
+        return resolve(printer_name, profile, source)
+
+    commands = []
+    monkeypatch.setattr(app, 'resolve_printer', resolve_then_reload)
+    monkeypatch.setattr(app.subprocess, 'run', lambda cmd, **kw: commands.append(cmd) or
+                        subprocess.CompletedProcess(cmd, 0, '', ''))
+    resp, code = app.process_print_job({'pdfUrl': str(pdf)})
+    assert (resp['status'], code) == ('ok', 200)
+    assert '/s"4x6"' in commands[0]
+    assert app.get_profile()['paperSize'] == 'A5'
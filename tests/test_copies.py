@@ -0,0 +1,53 @@
+import pytest
+
+import app
+
+BACKEND = app.BACKENDS['pdftoprinter']
+
+
+def write_pdf(tmp_path, pages):
+    path = tmp_path / 'label.pdf'
+    path.write_bytes(b'%PDF-1.4\n' + b''.join(b'<< /Type /Page >>\n' for _ in range(pages)) + b'<< /Type /Pages >>\n')
+    return str(path)
+
+
+def test_parse_page_range_returns_spans():
+    assert app.parse_page_range('1-3, 5') == [(1, 3), (5, 5)]
+
+
+@pytest.mark.parametrize('page_range', ['', '0', '3-1', 'a-b', '1-', '1,,2', '1-9999999'])
+def test_parse_page_range_rejects_bad_input(page_range):
+    with pytest.raises(ValueError):
+        app.parse_page_range(page_range)
+
+
+def test_parse_page_range_caps_total_pages_without_expanding():
+    with pytest.raises(ValueError, match='超过'):
+        app.parse_page_range('1-20000')
+    with pytest.raises(ValueError, match='超过'):
+        app.parse_page_range(','.join(['1-600'] * 2))
+    assert app.parse_page_range(f'1-{app.MAX_PAGES}') == [(1, app.MAX_PAGES)]
+
+
+def test_collated_copies_use_native_copies_switch(tmp_path):
+    args = app.copy_args(BACKEND, write_pdf(tmp_path, 2), 3, '1-2', True, [(1, 2)])
+    assert args == ['copies=3', 'pages=1-2']
+
+
+def test_uncollated_copies_expand_page_sequence(tmp_path):
+    assert app.copy_args(BACKEND, write_pdf(tmp_path, 3), 2, None, False, None) == ['pages=1,1,2,2,3,3']
+    assert app.copy_args(BACKEND, write_pdf(tmp_path, 9), 2, '2-3,5', False, [(2, 3), (5, 5)]) == ['pages=2,2,3,3,5,5']
+
+
+def test_uncollated_single_page_uses_copies_switch(tmp_path):
+    assert app.copy_args(BACKEND, write_pdf(tmp_path, 1), 4, None, False, None) == ['copies=4']
+
+
+def test_uncollated_with_unknown_page_count_is_an_error(tmp_path):
+    with pytest.raises(ValueError, match='页数'):
+        app.copy_args(BACKEND, str(tmp_path / 'missing.pdf'), 2, None, False, None)
+
+
+def test_uncollated_sequence_is_capped(tmp_path):
+    with pytest.raises(ValueError, match='上限'):
+        app.copy_args(BACKEND, write_pdf(tmp_path, 1), app.MAX_COPIES, f'1-{app.MAX_PAGES}', False, [(1, app.MAX_PAGES)])
@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import pytest
+import websockets
+
+import app
+import dispatcher
+
+
+@pytest.mark.parametrize('data, local', [
+    ({'pdfUrl': 'https://wms.example/label.pdf'}, False),
+    ({'PdfUrl': 'http://wms.example/label.pdf'}, False),
+    ({'pdfUrl': 'C:\\Windows\\win.ini'}, True),
+    ({'pdfUrl': '\\\\server\\share\\a.pdf'}, True),
+    ({'pdfUrl': 'file:///etc/passwd'}, True),
+    ({'pdfUrl': ['http://x']}, True),
+    ({}, False),
+])
+def test_is_local_pdf(data, local):
+    assert app.is_local_pdf(data) is local
+
+
+def test_fleet_config_requires_token():
+    with pytest.raises(ValueError, match='token'):
+        app.compile_config(dict(app.DEFAULT_CONFIG, fleet={'dispatcher': 'ws://10.0.0.1:12350/node'}))
+    config = app.compile_config(dict(app.DEFAULT_CONFIG, fleet={'dispatcher': 'ws://10.0.0.1:12350/node', 'token': 't'}))
+    assert config['fleet']['token'] == 't'
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(dispatcher, 'TOKEN', 's3cret')
+    return 's3cret'
+
+
+@pytest.mark.parametrize('headers, query, ok', [
+    ({}, '', False),
+    ({'Authorization': 'Bearer wrong'}, '', False),
+    ({'Authorization': 'Bearer s3cret'}, '', True),
+    ({}, '?token=s3cret', True),
+])
+def test_dispatcher_http_requires_token(token, monkeypatch, headers, query, ok):
+    monkeypatch.setattr(dispatcher, 'run_on_loop', lambda coro: coro.close() or {'status': 'ok'})
+    resp = dispatcher.app.test_client().post('/print' + query, json={'pdfUrl': 'C:\\a.pdf'}, headers=headers)
+    assert resp.status_code == (200 if ok else 401)
+
+
+def test_empty_dispatcher_token_authorizes_nothing(monkeypatch):
+    monkeypatch.setattr(dispatcher, 'TOKEN', '')
+    assert not dispatcher.authorized('')
+
+
+def test_node_registration_and_clients_require_token(token):
+    async def scenario():
+        dispatcher.LOOP = asyncio.get_running_loop()
+        async with websockets.serve(dispatcher.ws_router, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            results = {}
+            for name, sent in (('bad', 'wrong'), ('good', token)):
+                async with websockets.connect(f'ws://127.0.0.1:{port}/node') as ws:
+                    await ws.send(json.dumps({'type': 'register', 'node': 'station-1', 'token': sent, 'printers': ['P']}))
+                    try:
+                        results[name] = json.loads(await ws.recv())['type']
+                    except websockets.exceptions.ConnectionClosed as e:
+                        results[name] = e.rcvd.code
+            for name, path in (('client-bad', '/'), ('client-good', f'/?token={token}')):
+                async with websockets.connect(f'ws://127.0.0.1:{port}{path}') as ws:
+                    try:
+                        await ws.send(json.dumps({'method': 'getnodes'}))
+                        results[name] = json.loads(await ws.recv())['status']
+                    except websockets.exceptions.ConnectionClosed as e:
+                        results[name] = e.rcvd.code
+            return results
+
+    assert asyncio.run(scenario()) == {'bad': 1008, 'good': 'registered', 'client-bad': 1008, 'client-good': 'ok'}
+
+
+def test_push_targets_are_released_when_node_or_client_leaves(token, monkeypatch):
+    monkeypatch.setattr(dispatcher, 'JOB_CLIENTS', {})
+
+    async def node_session(port, job_ids):
+        ws = await websockets.connect(f'ws://127.0.0.1:{port}/node')
+        await ws.send(json.dumps({'type': 'register', 'node': 'station-1', 'token': token, 'printers': ['P']}))
+        assert json.loads(await ws.recv())['type'] == 'registered'
+
+        async def serve():
+            async for message in ws:
+                msg = json.loads(message)
+                job_id = f'job-{len(job_ids)}'
+                job_ids.append(job_id)
+                await ws.send(json.dumps({'type': 'accepted', 'reqId': msg['reqId']}))
+                await ws.send(json.dumps({'type': 'result', 'reqId': msg['reqId'],
+                                          'resp': {'status': 'ok', 'jobId': job_id}}))
+        return ws, asyncio.ensure_future(serve())
+
+    async def submit(port, track):
+        async with websockets.connect(f'ws://127.0.0.1:{port}/?token={token}') as client:
+            await client.send(json.dumps({'pdfUrl': 'http://x/a.pdf', 'printerName': 'P', 'track': track}))
+            assert json.loads(await client.recv())['status'] == 'ok'
+            return dict(dispatcher.JOB_CLIENTS)
+
+    async def scenario():
+        dispatcher.LOOP = asyncio.get_running_loop()
+        async with websockets.serve(dispatcher.ws_router, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            job_ids = []
+            node, serving = await node_session(port, job_ids)
+            untracked = await submit(port, False)
+            tracked = await submit(port, True)
+            await asyncio.sleep(0.1)
+            after_client_left = dict(dispatcher.JOB_CLIENTS)
+
+            # 客户端仍在线时节点断开 (Node drops while the client is still connected)
+            async with websockets.connect(f'ws://127.0.0.1:{port}/?token={token}') as client:
+                await client.send(json.dumps({'pdfUrl': 'http://x/a.pdf', 'printerName': 'P', 'track': True}))
+                await client.recv()
+                before_node_left = dict(dispatcher.JOB_CLIENTS)
+                await node.close()
+                serving.cancel()
+                await asyncio.sleep(0.1)
+                return untracked, tracked, after_client_left, before_node_left, dict(dispatcher.JOB_CLIENTS)
+
+    untracked, tracked, after_client_left, before_node_left, after_node_left = asyncio.run(scenario())
+    assert untracked == {}
+    assert list(tracked) == ['job-1']
+    assert after_client_left == {}
+    assert list(before_node_left) == ['job-2']
+    assert after_node_left == {}
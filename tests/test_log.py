@@ -0,0 +1,26 @@
+import threading
+
+import app
+
+
+def test_clear_log_file_resets_trim_counter(monkeypatch):
+    monkeypatch.setattr(app, 'LOG_KEEP_LINES', 5)
+    for i in range(3):
+        app.log(f'line {i}')
+    app.clear_log_file()
+    assert app._log_appended == 0
+    assert open(app.LOG_FILE, encoding='utf-8').read() == ''
+
+
+def test_clear_log_file_is_serialized_with_log(monkeypatch):
+    monkeypatch.setattr(app, 'LOG_KEEP_LINES', 10)
+    writers = [threading.Thread(target=lambda: [app.log('x') for _ in range(200)]) for _ in range(4)]
+    for t in writers:
+        t.start()
+    for _ in range(20):
+        app.clear_log_file()
+    for t in writers:
+        t.join()
+    lines = open(app.LOG_FILE, encoding='utf-8').read().splitlines()
+    assert all(line.endswith(' x') for line in lines)
+    assert len(lines) < 3 * app.LOG_KEEP_LINES
@@ -0,0 +1,45 @@
+import pytest
+
+import app
+
+
+def test_default_profile_compiles_paper_size():
+    profile = app.compile_profile('label', {'paperSize': '100x150'})
+    assert profile['compiledArgs'] == ('/s"100x150"',)
+
+
+@pytest.mark.parametrize('raw', [
+    {'orientation': 'sideways'},
+    {'dpi': 'abc'},
+    {'dpi': 0},
+    {'dpi': True},
+    {'copies': 0},
+    {'backend': 'nope'},
+])
+def test_invalid_values_are_rejected(raw):
+    with pytest.raises(ValueError):
+        app.compile_profile('x', raw)
+
+
+@pytest.mark.parametrize('raw', [{'orientation': 'landscape'}, {'dpi': 300}])
+def test_settings_pdftoprinter_cannot_express_are_rejected(raw):
+    with pytest.raises(ValueError, match='不支持'):
+        app.compile_profile('x', raw)
+
+
+def test_custom_template_may_use_orientation_and_dpi():
+    profile = app.compile_profile('x', {'orientation': 'landscape', 'dpi': 300,
+                                        'args': ['/s', 'orient={orientation}', 'dpi={dpi}']})
+    assert profile['compiledArgs'] == ('/s', 'orient=landscape', 'dpi=300')
+
+
+@pytest.mark.parametrize('args', [['/s"{paperSize}"', 'copies={copies}'], ['copies=2'], ['pages=1-2']])
+def test_template_may_not_repeat_per_job_arguments(args):
+    with pytest.raises(ValueError, match='份数或页码'):
+        app.compile_profile('x', {'args': args})
+
+
+def test_custom_template_gets_job_copies_once(tmp_path):
+    profile = app.compile_profile('x', {'args': ['/s"{paperSize}"']})
+    args = list(profile['compiledArgs']) + app.copy_args(app.BACKENDS['pdftoprinter'], str(tmp_path / 'a.pdf'), 3, None, True, None)
+    assert args == ['/s"100x150"', 'copies=3']
@@ -0,0 +1,88 @@
+import pytest
+
+import app
+import win32print as w
+
+
+def make_job(**overrides):
+    job = {'jobId': 'j1', 'printer': 'Label-Printer-1', 'document': 'abc.pdf', 'state': 'queued', 'final': False,
+           'spoolJobId': None, 'pagesPrinted': 0, 'totalPages': 0, 'submittedAt': 0.0, 'updatedAt': 0.0, 'listeners': []}
+    job.update(overrides)
+    return job
+
+
+def entry(status, job_id=7):
+    return {'id': job_id, 'document': 'C:\\cache\\abc.pdf', 'status': status, 'pagesPrinted': 1, 'totalPages': 1}
+
+
+@pytest.mark.parametrize('status, state', [
+    (0, 'queued'),
+    (w.JOB_STATUS_SPOOLING, 'printing'),
+    (w.JOB_STATUS_PRINTING, 'printing'),
+    (w.JOB_STATUS_PRINTED, 'printed'),
+    (w.JOB_STATUS_PRINTED | w.JOB_STATUS_DELETING, 'printed'),
+    (w.JOB_STATUS_COMPLETE | w.JOB_STATUS_DELETING, 'printed'),
+    (w.JOB_STATUS_PRINTING | w.JOB_STATUS_PAPEROUT, 'paper-out'),
+    (w.JOB_STATUS_ERROR, 'error'),
+    (w.JOB_STATUS_OFFLINE, 'error'),
+    (w.JOB_STATUS_BLOCKED_DEVQ, 'error'),
+    (w.JOB_STATUS_USER_INTERVENTION, 'error'),
+    (w.JOB_STATUS_DELETING, None),
+    (w.JOB_STATUS_DELETED, None),
+])
+def test_spool_state(status, state):
+    assert app.spool_state(status) == state
+
+
+def test_printed_and_deleting_is_final_printed():
+    job = make_job()
+    assert app._update_job(job, [entry(w.JOB_STATUS_PRINTED | w.JOB_STATUS_DELETING)], 1.0)
+    assert (job['state'], job['final'], job['spoolJobId']) == ('printed', True, 7)
+
+
+def test_deleting_alone_keeps_state_until_job_leaves_queue():
+    job = make_job(state='printing', spoolJobId=7)
+    assert not app._update_job(job, [entry(w.JOB_STATUS_DELETING)], 1.0)
+    assert (job['state'], job['final']) == ('printing', False)
+    assert app._update_job(job, [], 2.0)
+    assert (job['state'], job['final']) == ('printed', True)
+
+
+def test_error_then_deleted_is_final_error():
+    job = make_job(spoolJobId=7)
+    assert app._update_job(job, [entry(w.JOB_STATUS_ERROR)], 1.0)
+    assert (job['state'], job['final']) == ('error', False)
+    app._update_job(job, [entry(w.JOB_STATUS_ERROR | w.JOB_STATUS_DELETING)], 2.0)
+    assert job['final'] is False
+    assert app._update_job(job, [], 3.0)
+    assert (job['state'], job['final']) == ('error', True)
+
+
+def test_job_never_seen_becomes_unknown():
+    job = make_job()
+    assert not app._update_job(job, [], 1.0)
+    assert app._update_job(job, [], app.SPOOL_MATCH_TIMEOUT + 1)
+    assert (job['state'], job['final']) == ('unknown', True)
+
+
+def test_subscriber_racing_the_tracker_gets_the_final_event(monkeypatch):
+    import threading
+    entered = threading.Event()
+
+    class SlowList(list):
+        # 订阅者检查完状态、追加之前被抢占 (The subscriber is preempted between its check and the append)
+        def append(self, item):
+            entered.set()
+            threading.Event().wait(0.05)
+            super().append(item)
+
+    job = make_job(listeners=SlowList())
+    monkeypatch.setattr(app, 'TRACKED_JOBS', {job['jobId']: job})
+    events = []
+    subscriber = threading.Thread(target=app.subscribe_job, args=(job['jobId'], events.append))
+    subscriber.start()
+    entered.wait(1)
+    app._apply_spool_snapshot([job], [entry(w.JOB_STATUS_PRINTED)], 1.0)
+    subscriber.join()
+    assert [e['final'] for e in events] == [True]
+    assert job['listeners'] == []